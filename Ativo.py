@@ -1,154 +1,230 @@
-import pandas as pd
-import datetime
-from Utilities import divideDays
+import numpy as np
+import os
+from Bars import Bars, fromEpochDay, readBarsCsv, parseBarsCsv, toEpochDay
+from TradeEngine import firstTrue
+from AtivoDia import minuteToTime, TIME_STATS
+from Profiler import timed
+
+PRE_END = 9*60+30 # 9:30 em minutos do dia, até aqui (inclusive) é pre
+CORE_END = 16*60 # 16:00 em minutos do dia, até aqui (inclusive) é core, depois é pós
+
+# stats de dayStats, na ordem do dict IntraDay.stats (o gap é calculado por Ativo)
+DAY_STATS = ['volPre', 'moneyVolPre', 'openValue', 'highCoreValue', 'highCoreTime', 'highCorePosition',
+			'lowAfterHighValue', 'lowAfterHighTime', 'lowPositionAfterHigh', 'openToSpikePercent',
+			'spikeToLowPercent', 'volumeToSpike', 'spikeToPreVolFactor']
+
+def sessionBounds(bars, pre_end=PRE_END, core_end=CORE_END):
+	'''
+	Divide todas as barras de um ticker (Bars em ordem cronológica) em dias e sessões.
+	pre_end e core_end são os cortes em minutos do dia: pre vai até pre_end (inclusive), core até
+	core_end (inclusive) e o resto é pós.
+	Devolve um dict de arrays com uma posição por dia: day (dia desde EPOCH) e as posições globais
+	start, preEnd, coreEnd, end, ou seja, o dia k é start:end, o pre start:preEnd, o core preEnd:coreEnd
+	e o pós coreEnd:end
+	'''
+	days, offsets = bars.dayIndex()
+	starts, ends = offsets[:-1], offsets[1:]
+	mod = bars.minuteOfDay()
+	# como o minuto do dia é crescente dentro de cada dia, a fronteira é start + quantas barras estão antes dela
+	preEnd, coreEnd = starts.copy(), starts.copy()
+	if len(days):
+		preEnd += np.add.reduceat((mod <= pre_end).astype('int64'), starts)
+		coreEnd += np.add.reduceat((mod <= core_end).astype('int64'), starts)
+	return {'day':days, 'start':starts, 'preEnd':preEnd, 'coreEnd':coreEnd, 'end':ends}
+
+def _segmentReduce(ufunc, values, starts, ends, fill):
+	'''
+	ufunc.reduce de values[starts[k]:ends[k]] para cada k, fill nos segmentos vazios
+	'''
+	res = np.full(len(starts), fill, dtype=values.dtype)
+	nonempty = ends > starts
+	if nonempty.any():
+		# reduceat com os pares (start, end) intercalados reduz start:end nas posições pares
+		# o elemento extra no final é para end poder ser len(values)
+		idx = np.stack((starts[nonempty], ends[nonempty]), axis=1).ravel()
+		res[nonempty] = ufunc.reduceat(np.append(values, values[-1:]), idx)[::2]
+	return res
+
+@timed('day_stats', count=lambda res: len(res['volPre']))
+def dayStats(bars, bounds):
+	'''
+	Kernel vetorizado das stats de IntraDay para todos os dias de um ticker de uma vez, com as mesmas
+	definições e os mesmos valores de antes: posições relativas ao início do core, argmax/argmin pegando
+	a primeira ocorrência e spikeToPreVolFactor zero quando não tem volume de pre.
+	bounds é o resultado de sessionBounds. Devolve um dict de arrays (uma posição por dia) com as
+	chaves de DAY_STATS; highCoreTime e lowAfterHighTime em minutos do dia. Dias sem core ficam com nan
+	nos valores e -1 nas posições e nos tempos (None no dict de IntraDay.stats, ver AtivoDia.minuteToTime).
+	'''
+	preStart, coreStart, coreEnd = bounds['start'], bounds['preEnd'], bounds['coreEnd']
+	hasCore = coreEnd > coreStart
+	n = len(bars)
+	mod = bars.minuteOfDay()
+	cumVol = np.concatenate(([0], np.cumsum(bars.volume))).astype('int64')
+
+	volPre = cumVol[coreStart] - cumVol[preStart]
+	moneyVolPre = _segmentReduce(np.add, bars.volume*bars.close, preStart, coreStart, 0.0)
+
+	first = np.minimum(coreStart, n - 1) # primeira barra do core, só vale onde hasCore
+	openValue = np.where(hasCore, bars.open[first], np.nan)
+
+	# high do core e a primeira barra que atinge esse valor
+	highCoreValue = _segmentReduce(np.maximum, bars.high, coreStart, coreEnd, np.nan)
+	day = np.repeat(np.arange(len(coreStart)), bounds['end'] - preStart)
+	highAt = firstTrue(bars.high == highCoreValue[day], coreStart, coreEnd)
+
+	# low do highAt até o fim do core e a primeira barra que atinge esse valor
+	lowAfterHighValue = _segmentReduce(np.minimum, bars.low, highAt, coreEnd, np.nan)
+	pos = np.arange(n)
+	lowAt = firstTrue((bars.low == lowAfterHighValue[day]) & (pos >= highAt[day]), coreStart, coreEnd)
+
+	volumeToSpike = np.where(hasCore, cumVol[np.minimum(highAt + 1, n)] - cumVol[coreStart], 0)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		spikeToPreVolFactor = np.where(volPre == 0, 0, volumeToSpike/volPre)
+
+	highAt, lowAt = np.minimum(highAt, n - 1), np.minimum(lowAt, n - 1)
+	return {'volPre':volPre,
+			'moneyVolPre':moneyVolPre,
+			'openValue':openValue,
+			'highCoreValue':highCoreValue,
+			'highCoreTime':np.where(hasCore, mod[highAt], -1),
+			'highCorePosition':np.where(hasCore, highAt - coreStart, -1),
+			'lowAfterHighValue':lowAfterHighValue,
+			'lowAfterHighTime':np.where(hasCore, mod[lowAt], -1),
+			'lowPositionAfterHigh':np.where(hasCore, lowAt - coreStart, -1),
+			'openToSpikePercent':(highCoreValue - openValue)/openValue,
+			'spikeToLowPercent':(lowAfterHighValue - highCoreValue)/highCoreValue,
+			'volumeToSpike':volumeToSpike,
+			'spikeToPreVolFactor':spikeToPreVolFactor}
+
+def dayGaps(bars, bounds, openValue):
+	'''
+	gap de cada dia: open do core em relação ao close do core do último dia anterior que teve core,
+	zero no primeiro dia (e nan enquanto nenhum dia anterior teve core)
+	openValue é a coluna de dayStats
+	'''
+	hasCore = bounds['coreEnd'] > bounds['preEnd']
+	lastClose = np.where(hasCore, bars.close[np.maximum(bounds['coreEnd'] - 1, 0)], np.nan)
+	# índice do último dia com core até cada dia (inclusive), -1 se ainda não houve nenhum
+	last = np.maximum.accumulate(np.where(hasCore, np.arange(len(hasCore)), -1))
+	prevClose = np.where(last >= 0, lastClose[np.maximum(last, 0)], np.nan)
+	gap = np.zeros(len(openValue))
+	gap[1:] = (openValue[1:] - prevClose[:-1])/prevClose[:-1]
+	return gap
+
 
 
 class IntraDay():
 	'''
 	Classe responsável por manter os dados dentro de um dia para algum ativo qualquer
-	dataDay é uma list contendo os tickers de um dia qualquer de forma raw, sem nenhuma organização
+	dataDay é um Bars (ou, por compatibilidade, uma list de dicts) contendo as barras de um dia qualquer de forma raw
 	Essa classe organiza os dados em _pre, _core, _after e fornece alguns métodos interessantes
+	O IntraDay é uma view leve: guarda só o Bars, as posições do dia e das sessões (bounds de sessionBounds,
+	quando criado por Ativo com o Bars do ticker inteiro) e as colunas de stats do ticker, se houver.
+	_pre, _core, _pos e o dict stats são montados no primeiro acesso e guardados
 	'''
-	def __init__(self,dataDay): # dataDay is one element of the list dataDays
-
-		self.dataDay = dataDay
-		self.date = dataDay[0]['time'].date()
-		self._pre = []
-		self._core = []
-		self._pos = []
-
-		for dt in dataDay: # dt seria pra cada datetime (time com date), por isso extraímos dt.time()
-			t1 = datetime.time(9,30)
-			t2 = datetime.time(16,0)
-
-			if dt['time'].time() <= t1: # se for horário de pre
-			    self._pre.append(dt)
-			elif t1 < dt['time'].time() <= t2: # se for horário de core
-			    self._core.append(dt)
-			else: # se for o que sobrou, horário de pós
-			    self._pos.append(dt)
-
-		if len(self._core)==0: # se tivermos core nulo mas pre ou pos não nulos, varemos alguns ajustes.
-			if len(self._pre) > 0:
+	__slots__ = ('_bars', '_start', '_preEnd', '_coreEnd', '_end', '_k', '_tickerStats', 'date', '_sessions', '_stats')
+
+	def __init__(self, dataDay, bounds=None, k=0, stats=None): # dataDay is one element of the list dataDays
+
+		if bounds is None: # um dia solto
+			if not isinstance(dataDay, Bars): # list de dicts do formato antigo
+				dataDay = Bars.fromDicts(dataDay)
+			# fronteiras das sessões pelos cortes em minutos do dia, sem criar datetime.time por barra
+			bounds = sessionBounds(dataDay)
+
+		self._bars = dataDay
+		self._start, self._preEnd, self._coreEnd, self._end = (int(bounds[c][k]) for c in ('start', 'preEnd', 'coreEnd', 'end'))
+		self._k = k
+		self._tickerStats = stats # colunas de dayStats do ticker inteiro, ou None
+		self.date = fromEpochDay(bounds['day'][k])
+		self._sessions = None
+		self._stats = None
+
+		if self._coreEnd == self._preEnd: # se tivermos core nulo mas pre ou pos não nulos, varemos alguns ajustes.
+			if self._preEnd > self._start:
 				print('caso core vazio mas com pre')
-			if len(self._pos) > 0:
+			if self._end > self._coreEnd:
 				print('caso core vazio mas com pos')
 
-		self._initializeIntradayStats()
-
+	@property
+	def dataDay(self):
+		return self._bars[self._start:self._end]
 
-	def _initializeIntradayStats(self):
-		self.stats = {} # empty curly cria empty dict e não empty set
-
-		# calcula volume pre market
-		volPre = 0
-		for b in self._pre:
-			volPre = volPre + b['volume']
-		self.stats['volPre'] = volPre
+	def _initSessions(self):
+		if self._sessions is None:
+			b = self._bars
+			self._sessions = (b[self._start:self._preEnd], b[self._preEnd:self._coreEnd], b[self._coreEnd:self._end])
+		return self._sessions
 
-		# calcula money volume de pre market
-		moneyVolPre = 0
-		for b in self._pre:
-			moneyVolPre += b['volume']*b['close']
-		self.stats['moneyVolPre'] = moneyVolPre
+	@property
+	def _pre(self):
+		return self._initSessions()[0]
 
-		# calcula open value
-		self.stats['openValue'] = self._core[0]['open']
+	@property
+	def _core(self):
+		return self._initSessions()[1]
 
-		# calcula o valor mais alto do core, a hora na qual aconteceu e a position
-		highCoreValue = self._core[0]['high']
-		highCoreTime = self._core[0]['time'].time()
-		highCorePosition = 0
+	@property
+	def _pos(self):
+		return self._initSessions()[2]
 
-		for b in self._core:
-			if highCoreValue < b['high']:
-				highCoreValue = b['high']
-				highCoreTime = b['time'].time()
-				highCorePosition = self._core.index(b)
-
-		self.stats['highCoreValue'] = highCoreValue
-		self.stats['highCoreTime'] = highCoreTime
-		self.stats['highCorePosition'] = highCorePosition
-
-		# calcula o low depois do high
-		lowAfterHighValue = self._core[highCorePosition]['high']
-		lowAfterHighTime = self._core[highCorePosition]['time'].time()
-		lowPositionAfterHigh = highCorePosition
-
-		for b in self._core[highCorePosition:]: # da high position pra frente
-			if lowAfterHighValue > b['low']:
-				lowAfterHighValue = b['low']
-				lowAfterHighTime = b['time'].time()
-				lowPositionAfterHigh = self._core.index(b)
-
-		self.stats['lowAfterHighValue'] = lowAfterHighValue
-		self.stats['lowAfterHighTime'] = lowAfterHighTime
-		self.stats['lowPositionAfterHigh'] = lowPositionAfterHigh
-
-		# calcula variação percentual do open até o spike
-
-		highCoreValue = self._core[highCorePosition]['high'] # escrevendo denovo só pra não se perder
-		openValue = self._core[0]['open']
-		openToSpikePercent = (highCoreValue - openValue)/openValue
-		self.stats['openToSpikePercent'] = openToSpikePercent
-
-		# calcula variação percentual do spike até o low
-		highCoreValue = self._core[highCorePosition]['high'] # escrevendo denovo só pra não se perder
-		lowAfterHighValue = self._core[lowPositionAfterHigh]['low']
-		spikeToLowPercent = (lowAfterHighValue - highCoreValue)/highCoreValue
-		self.stats['spikeToLowPercent'] = spikeToLowPercent
-
-		# calcula volume from start of core to spike
-		volumeToSpike = 0
-		for b in self._core[:(highCorePosition+1)]: # o mais 1 é pq em python o end é exclusive
-			volumeToSpike += b['volume']
-		self.stats['volumeToSpike'] = volumeToSpike
-
-		# calcula fator (volume até o spike)/(volume pre)
-		spikeToPreVolFactor = 0
-		if volPre == 0:
-			spikeToPreVolFactor = 0
-		else:
-			spikeToPreVolFactor = volumeToSpike/volPre
-		self.stats['spikeToPreVolFactor'] = spikeToPreVolFactor
+	@property
+	def stats(self):
+		if self._stats is None:
+			self._initializeIntradayStats()
+		return self._stats
 
+	def _initializeIntradayStats(self):
+		# mesmo kernel usado para o ticker inteiro (dayStats), aqui com um dia só se o ticker não passou as colunas
+		cols, k = self._tickerStats, self._k
+		if cols is None:
+			cols, k = dayStats(self.dataDay, sessionBounds(self.dataDay)), 0
+		self._stats = {} # empty curly cria empty dict e não empty set
+		for s in cols:
+			v = cols[s][k]
+			self._stats[s] = minuteToTime(v) if s in TIME_STATS else v.item()
+
+	@timed('check_for_trade')
 	def checkForTrade(self, short_after, exit_target, exit_stop):
 		trade = {} # se não tiver trade nesse dia o dictionary fica vazio
-		first = self._core[0]
-
-		for bar in self._core: 
-			# ENTRY POINT
-			if not bool(trade): # se nenhum trade tiver sido encontrado, procura por trades
-				if bar != self._core[-1]:
-					variation = (bar['high'] - first['open'])/first['open']
-					if variation >= short_after:
-						trade['entry'] = bar
-						trade['price'] = (1+short_after)*first['open']
-						trade['stop'] = (1+exit_stop)*trade['price']
-						trade['target'] = (1-exit_target)*trade['price'] # lembrar que pra short o target é menor
-			# EXIT POINTS
-			else: # se já tivermos encontrado algum trade, vamos procurar exits
-				if bar['high'] >= trade['stop']:
-					trade['exit'] = bar
-					trade['profit'] = -exit_stop
-					break # só pararemos a execução do loop apos encontrar uma entry e um stop
-				if bar['low'] <= trade['target']:
-					trade['exit'] = bar
-					trade['profit'] = exit_target
-					break
-				if bar == self._core[-1]: # se for a última barra, fecha o trade no close da ultima barra
-					trade['exit'] = bar
-					trade['profit'] = -(bar['close'] - trade['price'])/trade['price']
-
-		if not bool(trade): # testa se o dictionary com dados sobre um possível trade está vazio
+		core = self._core
+		first_open = core.open[0]
+
+		# ENTRY POINT
+		# primeira barra (exceto a última) cuja high atinge short_after acima do open
+		variation = (core.high[:-1] - first_open)/first_open
+		crossed = variation >= short_after
+		if not crossed.any(): # nenhum trade nesse dia
 			return None
+		e = int(crossed.argmax()) # argmax de um array booleano é o primeiro True
+
+		price = (1+short_after)*first_open
+		trade['entry'] = core.bar(e)
+		trade['price'] = float(price)
+		trade['stop'] = float((1+exit_stop)*price)
+		trade['target'] = float((1-exit_target)*price) # lembrar que pra short o target é menor
+
+		# EXIT POINTS
+		# o stop é testado antes do target, então se a mesma barra tocar os dois conta como stop
+		after = core[e+1:]
+		hit = (after.high >= trade['stop']) | (after.low <= trade['target'])
+		if hit.any():
+			x = e + 1 + int(hit.argmax())
+			trade['exit'] = core.bar(x)
+			if core.high[x] >= trade['stop']:
+				trade['profit'] = -exit_stop
+			else:
+				trade['profit'] = exit_target
+		else: # se chegar na última barra, fecha o trade no close da ultima barra
+			trade['exit'] = core.bar(-1)
+			trade['profit'] = -(trade['exit']['close'] - trade['price'])/trade['price']
 
 		return trade # se o dictionary não estiver vazio, vai retornar os dados em trade
 
 	def __repr__(self):
 
 		s = ''
-		s = s + f"{self.dataDay[0]['time'].date()}\n"
+		s = s + f"{self.date}\n"
 		s = s + f"{self.stats}\n"
 		s = s + f"_pre\n"
 		for b in self._pre:
@@ -164,85 +240,74 @@ class IntraDay():
 class Ativo():
 	'''
 	Classe responsável por parsear os dados de uma ação específica
+	bars pode ser passado já carregado (por exemplo fm.getBars(name), que usa o cache binário),
+	nesse caso o csv em path não é lido
 	'''
-	def __init__(self, name, path):
+	def __init__(self, name, path, bars=None):
 
 		self.name = name
 		self.path = path
 
-		data = [] # list of bars, which are dicts containing tick information
-		with open(path, 'r') as file:
-		    line = file.readline() # le a primeira vez e descarta o header
-		    line = file.readline() # le a primeira vez e tenta continuar a ler
-		    while line:
-		        tokens = line.split(',')
-		        bar = { 'time':datetime.datetime.strptime(tokens[0], '%Y-%m-%d %H:%M:%S'),
-		                'open':float(tokens[1]),
-		                'high':float(tokens[2]),
-		                'low':float(tokens[3]),
-		                'close':float(tokens[4]),
-		                'volume':int(tokens[5])}
-		        data.append(bar)
-		        line = file.readline()
-		data.reverse()
-		self.data = data
+		if bars is None:
+			# lê o arquivo inteiro de uma vez, já em colunas e em ordem cronológica
+			bars = readBarsCsv(path)
+		self.data = bars
 		self._initDayData()
 		self._initIntradayData()
 		self._initOuterDayStats()
 
 	@staticmethod # usamos @staticmethod e não @classmethod pois não precisaremos instanciar a classe com cls
-					# na verdade nem usamos name
-	def initIntradayFromDate(name, path, d): # d é a data em formato datetime.date
+	@timed('day_lookup', count=lambda intra: 1)
+	def initIntradayFromDate(name, path, d, cache=None): # d é a data em formato datetime.date
+		# com o cache (fm.cache) o dia é achado pelo índice de datas, sem reler o arquivo
+		if cache is not None:
+			data = cache.loadDay(name, path, d)
+			if data is None:
+				raise KeyError(f"{name} não tem dados em {d}")
+			return IntraDay(data)
+
+		# sem cache, varre o csv inteiro atrás das linhas do dia
 		# https://stackoverflow.com/questions/15718068/search-file-and-find-exact-match-and-print-line
-		data = []
-		with open(path, 'r') as file:
-			lines = [line for line in file if line.startswith(d.strftime("%Y-%m-%d"))]
-		lines.reverse()
-		for line in lines:
-			tokens = line.split(',')
-			bar = { 'time':datetime.datetime.strptime(tokens[0], '%Y-%m-%d %H:%M:%S'),
-					'open':float(tokens[1]),
-					'high':float(tokens[2]),
-					'low':float(tokens[3]),
-					'close':float(tokens[4]),
-					'volume':int(tokens[5])}
-			data.append(bar)
+		with open(path, 'rb') as file:
+			prefix = d.strftime("%Y-%m-%d").encode()
+			lines = [line for line in file if line.startswith(prefix)]
+		data = parseBarsCsv(b''.join(lines))
 
 		return IntraDay(data)
 
-	# são os dados brutos divididos em dias, mas ainda não divididos em core, pre, pos e stats
+	# divide as barras em dias e sessões, guardando só as posições (ver sessionBounds)
 	def _initDayData(self):
-		self.dataDays = divideDays(self.data)
+		self._bounds = sessionBounds(self.data)
+
+	# são os dados brutos divididos em dias, mas ainda não divididos em core, pre, pos e stats
+	@property
+	def dataDays(self):
+		return [intra.dataDay for intra in self.intraDays]
 
-	# agora os dias divididos em core, pre, pos e stats, ou seja, dados intraday
+	# agora os dias como IntraDays, que são só views sobre self.data com as stats do ticker
 	def _initIntradayData(self):
-		self.intraDays = []
-		for d in self.dataDays:
-			self.intraDays.append( IntraDay(d) )
+		self._stats = dayStats(self.data, self._bounds)
+		self.intraDays = [IntraDay(self.data, self._bounds, k, self._stats) for k in range(len(self._bounds['day']))]
 
 	# aqui vamos inicializar algumas stats que não são autocontidas em um dia, como o gap, que 
 	# precisa ser calculado sempre em relação ao dia anterior
-	# cuidar pois nessa função estamos quebrando encapsulamento por questão de comodidade
 	def _initOuterDayStats(self):
+		self._stats['gap'] = dayGaps(self.data, self._bounds, self._stats['openValue'])
 
-		gap = 0
-		dayBefore = self.intraDays[0]
-		for day in self.intraDays:
-			if dayBefore == day: # caso seja o primeiro dia, seta gap como zero, pois não faz sentido o calculo
-				day.stats['gap'] = 0
-				dayBefore = day
-			else:
-				firstOpen = day._core[0]['open']
-				lastClose = dayBefore._core[-1]['close']
-				day.stats['gap'] = (firstOpen - lastClose)/lastClose
-				dayBefore = day
-
-	# esse método filtra o dia de interesse e retorna um objeto da classe Intraday (aka ativo-dia)
-	# https://stackoverflow.com/questions/34609935/passing-a-function-with-two-arguments-to-filter-in-python/34610018
-	# https://stackoverflow.com/questions/7125467/find-object-in-list-that-has-attribute-equal-to-some-value-that-meets-any-condi
-	# daria pra fazer com filter mas no final das contas next() é a melhor opção
+	def statColumns(self):
+		'''
+		stats de todos os dias em colunas (dict de arrays, uma posição por dia, na ordem de intraDays),
+		com highCoreTime e lowAfterHighTime em minutos do dia
+		'''
+		return self._stats
+
+	# esse método devolve o objeto da classe Intraday (aka ativo-dia) do dia de interesse
+	# a busca é um searchsorted nos dias do ticker, em vez do next() linear sobre intraDays
 	def fromDay(self,d):
-		return next(intra for intra in self.intraDays if intra.dataDay[0]['time'].date() == d )
+		k = np.searchsorted(self._bounds['day'], toEpochDay(d))
+		if k == len(self.intraDays) or self._bounds['day'][k] != toEpochDay(d):
+			raise KeyError(f"{self.name} não tem dados em {d}")
+		return self.intraDays[k]
 
 	def __repr__(self):
 		s=''
@@ -251,4 +316,62 @@ class Ativo():
 
 
 	def show(self):
-		print(self.dataDays)
\ No newline at end of file
+		print(self.dataDays)
+
+
+class DayLoader():
+	'''
+	Carrega os IntraDays (ativo-dias) pedidos por uma simulação.
+	Os pedidos são agrupados por ticker, então cada arquivo é aberto uma única vez, e os dias já
+	carregados ficam guardados em self.days, de forma que rodar a simulação de novo com outros
+	parâmetros (runSimulationGroup) não lê nada do disco para os dias que já foram usados.
+	files_read e bytes_read contam o que foi lido desde o último resetCounters().
+	------------------------------------------------------------------------------------------
+	Exemplo: loader = DayLoader(fm)
+			 intras = loader.load(fad) # mesma ordem de fad
+	------------------------------------------------------------------------------------------
+	'''
+	def __init__(self, fm):
+		self.fm = fm
+		self.days = {} # (name, date) -> IntraDay
+		self.resetCounters()
+
+	def resetCounters(self):
+		self.files_read = 0
+		self.bytes_read = 0
+
+	def clear(self):
+		self.days = {}
+
+	def _loadTicker(self, name, dates):
+		cache = self.fm.cache
+		path = self.fm[name]
+		if not cache.isValid(name, path): # vai precisar parsear o csv inteiro
+			self.bytes_read += os.path.getsize(path)
+		bars = cache.load(name, path)
+		days, offsets = cache.loadIndex(name, path)
+		self.files_read += 1
+
+		for d in dates:
+			k = np.searchsorted(days, toEpochDay(d))
+			if k == len(days) or days[k] != toEpochDay(d):
+				raise KeyError(f"{name} não tem dados em {d}")
+			day = bars[offsets[k]:offsets[k+1]]
+			self.bytes_read += sum(getattr(day, c).nbytes for c in Bars.COLUMNS) # páginas do mmap que serão lidas
+			self.days[(name, d)] = IntraDay(day)
+
+	@timed('day_lookup', count=len)
+	def load(self, ads):
+		'''
+		ads: lista de ativo-dias (dicts com 'name' e 'date'), como self.fad do TradesAnalyser
+		devolve a lista de IntraDays na mesma ordem
+		'''
+		pending = {} # name -> datas que ainda não estão em self.days
+		for ad in ads:
+			if (ad['name'], ad['date']) not in self.days:
+				pending.setdefault(ad['name'], set()).add(ad['date'])
+
+		for name in sorted(pending):
+			self._loadTicker(name, sorted(pending[name]))
+
+		return [self.days[(ad['name'], ad['date'])] for ad in ads]
\ No newline at end of file
@@ -0,0 +1,193 @@
+import numpy as np
+import datetime
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from ColumnStore import ColumnStore
+
+# stats de cada ativo-dia, na ordem em que IntraDay e Ativo calculam
+STATS = ['volPre', 'moneyVolPre', 'openValue', 'highCoreValue', 'highCoreTime', 'highCorePosition',
+		'lowAfterHighValue', 'lowAfterHighTime', 'lowPositionAfterHigh', 'openToSpikePercent',
+		'spikeToLowPercent', 'volumeToSpike', 'spikeToPreVolFactor', 'gap']
+# stats que são datetime.time, guardadas na tabela como minutos do dia
+TIME_STATS = ['highCoreTime', 'lowAfterHighTime']
+INT_STATS = ['volPre', 'highCorePosition', 'lowPositionAfterHigh', 'volumeToSpike']
+
+
+# dias sem core não têm highCoreTime nem lowAfterHighTime: None nos dicts, -1 nas colunas (ver Ativo.dayStats)
+def timeToMinute(t):
+	if t is None:
+		return -1
+	return t.hour*60 + t.minute
+
+def minuteToTime(m):
+	if m < 0:
+		return None
+	return datetime.time(int(m)//60, int(m)%60)
+
+
+class AtivoDiaTable():
+	'''
+	A lista de ativo-dias (dicts com name, date, freefloat e stats) em formato colunar: um array numpy
+	por campo, com as stats "achatadas" (t['volPre'], t['gap'], ...). Serve para filtrar com máscaras
+	booleanas em vez de filter + lambda, e as máscaras de cada limiar ficam em cache, então um sweep
+	sobre gap_threshold ou F_high_threshold só calcula cada máscara uma vez.
+	------------------------------------------------------------------------------------------
+	Exemplo: adt = AtivoDiaTable.fromList(ativo_dia_list)
+			 m = adt.mask('gap', '>=', 0.2) & adt.mask('F', '<=', 1)
+			 adt.toList(np.flatnonzero(m))
+	------------------------------------------------------------------------------------------
+	'''
+	def __init__(self, columns):
+		self.columns = dict(columns)
+		self._masks = {} # (campo, operador, limiar) -> máscara booleana
+
+	@classmethod
+	def fromList(cls, adl):
+		cols = {'name': np.array([ad['name'] for ad in adl], dtype='U'),
+				'date': np.array([ad['date'] for ad in adl], dtype='datetime64[D]'),
+				'freefloat': np.array([ad['freefloat'] for ad in adl], dtype='float64')}
+		stats = [s for s in STATS if adl and s in adl[0]['stats']]
+		for s in stats:
+			if s in TIME_STATS:
+				cols[s] = np.array([timeToMinute(ad['stats'][s]) for ad in adl], dtype='int64')
+			elif s in INT_STATS:
+				cols[s] = np.array([ad['stats'][s] for ad in adl], dtype='int64')
+			else:
+				cols[s] = np.array([ad['stats'][s] for ad in adl], dtype='float64')
+		return cls(cols)
+
+	@classmethod
+	def fromStore(cls, path, columns=None):
+		'''
+		abre uma tabela gravada por buildAtivoDiaStore, opcionalmente só com algumas colunas
+		'''
+		return cls(ColumnStore(path).read(columns))
+
+	def __len__(self):
+		return len(self.columns['name'])
+
+	def __getitem__(self, field):
+		if field == 'F': # fator F, volume de pre market sobre o free float
+			if 'F' not in self.columns:
+				self.columns['F'] = self.columns['volPre']/self.columns['freefloat']
+			return self.columns['F']
+		return self.columns[field]
+
+	def setColumn(self, field, values):
+		'''
+		troca uma coluna (por exemplo o freefloat), jogando fora as máscaras e o F que dependiam dela
+		'''
+		self.columns[field] = np.asarray(values)
+		self.columns.pop('F', None)
+		self._masks = {}
+
+	def mask(self, field, op, threshold):
+		'''
+		máscara booleana field op threshold, com op em '>=' ou '<=', guardada em cache
+		'''
+		key = (field, op, threshold)
+		if key not in self._masks:
+			if op == '>=':
+				self._masks[key] = self[field] >= threshold
+			elif op == '<=':
+				self._masks[key] = self[field] <= threshold
+			else:
+				raise ValueError(f"operador {op} não suportado")
+		return self._masks[key]
+
+	def toList(self, idx=None):
+		'''
+		devolve os ativo-dias de idx (todos, se None) no formato de dict antigo
+		'''
+		if idx is None:
+			idx = np.arange(len(self))
+		stats = [s for s in STATS if s in self.columns]
+		dates = self.columns['date'][idx].astype(datetime.date)
+		adl = []
+		for k, i in enumerate(idx):
+			st = {}
+			for s in stats:
+				v = self.columns[s][i]
+				st[s] = minuteToTime(v) if s in TIME_STATS else v.item()
+			adl.append({'name': str(self.columns['name'][i]),
+						'date': dates[k],
+						'freefloat': self.columns['freefloat'][i].item(),
+						'stats': st})
+		return adl
+
+def iterAtivoDiaBlocks(fm, names=None, workers=None, cache=True, freefloat=None):
+	'''
+	Gerador com as colunas (dict de arrays, formato de AtivoDiaTable) dos ativo-dias de cada ticker,
+	na ordem de names (por padrão fm.getNames()), pulando os tickers sem free float.
+	Com freefloat (um FreeFloat.FreeFloatHistory) o free float de cada dia é o do último snapshot até
+	aquele dia, e só são pulados os tickers que não aparecem em nenhum snapshot; senão vale o snapshot
+	único do FileManager para todos os dias.
+	Os tickers são processados em paralelo por um pool de workers processos (workers=0 roda no próprio
+	processo). Só há um número limitado de tickers em andamento de cada vez, então a memória usada não
+	depende do tamanho do universo, só de workers. Com cache=True as barras são lidas pelo cache binário
+	do FileManager (e o cache é criado para os tickers que ainda não têm).
+	'''
+	names = fm.getNames() if names is None else names
+	cache_root = fm.cache.root if cache else None
+	if freefloat is None:
+		tasks = ((n, fm[n], fm.getFreeFloat(n), cache_root) for n in names if n in fm.freeFloat)
+	else:
+		known = set(freefloat.getNames())
+		tasks = ((n, fm[n], np.nan, cache_root) for n in names if n in known)
+	for cols in _runTickers(tasks, workers):
+		if freefloat is not None:
+			cols['freefloat'] = freefloat.asOf(cols['name'], cols['date'])
+		yield cols
+
+def _runTickers(tasks, workers):
+	import Parallel as par # import aqui dentro pra evitar import circular
+	if workers == 0:
+		for task in tasks:
+			yield par._tickerAtivoDias(task)
+		return
+
+	workers = workers or os.cpu_count()
+	with ProcessPoolExecutor(max_workers=workers) as pool:
+		pending = deque()
+		limit = 2*workers # tickers em andamento, é o que limita a memória
+		for task in tasks:
+			pending.append(pool.submit(par._tickerAtivoDias, task))
+			if len(pending) >= limit:
+				yield pending.popleft().result()
+		while pending:
+			yield pending.popleft().result()
+
+def iterAtivoDias(fm, names=None, workers=None, cache=True, freefloat=None):
+	'''
+	gerador com os ativo-dias um a um, no formato de dict antigo (o mesmo de AtivoDiaList.pkl)
+	'''
+	for cols in iterAtivoDiaBlocks(fm, names, workers, cache, freefloat):
+		yield from AtivoDiaTable(cols).toList()
+
+def buildAtivoDiaStore(fm, path, names=None, workers=None, chunk_rows=200000, cache=True, freefloat=None):
+	'''
+	Monta a tabela de ativo-dias do universo inteiro e grava em path como ColumnStore, em chunks de
+	pelo menos chunk_rows linhas, sem nunca ter a lista inteira em memória.
+	Se path já tiver dados, os novos chunks são acrescentados no final.
+	Devolve o número de ativo-dias gravados.
+	------------------------------------------------------------------------------------------
+	Exemplo: buildAtivoDiaStore(fm, 'ativo_dias.cols', workers=8)
+			 adt = AtivoDiaTable.fromStore('ativo_dias.cols')
+	------------------------------------------------------------------------------------------
+	'''
+	store = ColumnStore(path)
+	buf, rows, total = [], 0, 0
+	for cols in iterAtivoDiaBlocks(fm, names, workers, cache, freefloat):
+		if len(cols['name']) == 0:
+			continue
+		buf.append(cols)
+		rows += len(cols['name'])
+		if rows >= chunk_rows:
+			store.append({c: np.concatenate([b[c] for b in buf]) for c in buf[0]})
+			total += rows
+			buf, rows = [], 0
+	if rows:
+		store.append({c: np.concatenate([b[c] for b in buf]) for c in buf[0]})
+		total += rows
+	return total
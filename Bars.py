@@ -0,0 +1,205 @@
+import numpy as np
+import pandas as pd
+import datetime
+import io
+from Profiler import timed
+
+EPOCH = datetime.datetime(1970, 1, 1)
+MINUTES_PER_DAY = 24*60
+
+
+def toEpochMinute(dt):
+	'''
+	converte um datetime (naive, no fuso do csv) para minutos desde 1970-01-01
+	'''
+	return (dt - EPOCH)//datetime.timedelta(minutes=1)
+
+def fromEpochMinute(m):
+	'''
+	operação inversa de toEpochMinute, devolve um datetime
+	'''
+	return EPOCH + datetime.timedelta(minutes=int(m))
+
+def toEpochDay(d):
+	'''
+	converte um datetime.date para dias desde 1970-01-01
+	'''
+	return (d - EPOCH.date()).days
+
+def fromEpochDay(n):
+	return EPOCH.date() + datetime.timedelta(days=int(n))
+
+# posições dos dígitos dentro de 'YYYY-mm-dd HH:MM:SS'
+_TS_LEN = 19
+_TS_DIGITS = np.array([0,1,2,3, 5,6, 8,9, 11,12, 14,15])
+
+def parseTimestamps(buf, starts):
+	'''
+	parse vetorizado do layout fixo '%Y-%m-%d %H:%M:%S'
+	buf: bytes do arquivo como array de uint8
+	starts: posição do início de cada linha dentro de buf
+	devolve epoch-minutes (int64), os segundos são descartados como em toEpochMinute
+	'''
+	dg = buf[starts[:,None] + _TS_DIGITS].astype('int64') - ord('0')
+	Y = dg[:,0]*1000 + dg[:,1]*100 + dg[:,2]*10 + dg[:,3]
+	M = dg[:,4]*10 + dg[:,5]
+	D = dg[:,6]*10 + dg[:,7]
+	h = dg[:,8]*10 + dg[:,9]
+	m = dg[:,10]*10 + dg[:,11]
+
+	# days from civil (algoritmo do Howard Hinnant), trocando o ano pra começar em março
+	y = Y - (M <= 2)
+	era = y//400
+	yoe = y - era*400
+	doy = (153*((M + 9) % 12) + 2)//5 + D - 1
+	doe = yoe*365 + yoe//4 - yoe//100 + doy
+	days = era*146097 + doe - 719468
+
+	return days*MINUTES_PER_DAY + h*60 + m
+
+def parseBarsCsv(raw):
+	'''
+	raw: bytes com as linhas do csv (sem o header), no formato time,open,high,low,close,volume
+	as linhas vêm do mais recente pro mais antigo, como nos arquivos originais, e o Bars
+	devolvido já está em ordem cronológica (sem precisar de data.reverse())
+	'''
+	buf = np.frombuffer(raw, dtype='uint8')
+	if len(buf) == 0:
+		return Bars.empty()
+	nl = np.flatnonzero(buf == ord('\n'))
+	starts = np.concatenate(([0], nl + 1))
+	ends = np.concatenate((nl, [len(buf)]))
+	starts = starts[ends - starts >= _TS_LEN] # descarta linhas em branco (ex: a última depois do \n final)
+	if len(starts) == 0:
+		return Bars.empty()
+
+	# os números ficam com o parser em C do pandas, o timestamp é feito na mão logo acima
+	# round_trip garante o mesmo float que o float(token) do loop antigo
+	num = pd.read_csv(io.BytesIO(raw), header=None, usecols=[1,2,3,4,5], float_precision='round_trip',
+					names=['time','open','high','low','close','volume'],
+					dtype={'open':'float64','high':'float64','low':'float64','close':'float64','volume':'int64'})
+	if len(num) != len(starts):
+		raise ValueError(f"csv mal formado: {len(starts)} timestamps e {len(num)} linhas numéricas")
+
+	# [::-1] inverte a ordem das linhas, e ascontiguousarray garante colunas contíguas
+	return Bars(parseTimestamps(buf, starts[::-1]),
+				np.ascontiguousarray(num['open'].to_numpy()[::-1]),
+				np.ascontiguousarray(num['high'].to_numpy()[::-1]),
+				np.ascontiguousarray(num['low'].to_numpy()[::-1]),
+				np.ascontiguousarray(num['close'].to_numpy()[::-1]),
+				np.ascontiguousarray(num['volume'].to_numpy()[::-1]))
+
+@timed('csv_parse', count=len)
+def readBarsCsv(path):
+	'''
+	lê o csv de um ticker inteiro de uma vez e devolve um Bars em ordem cronológica
+	'''
+	with open(path, 'rb') as file:
+		file.readline() # descarta o header
+		raw = file.read()
+	return parseBarsCsv(raw)
+
+
+class Bars():
+	'''
+	Container colunar de barras de 1 minuto de um ativo.
+	Em vez de uma list de dicts, guardamos arrays contíguos:
+		time   int64   minutos desde 1970-01-01 (epoch-minute)
+		open, high, low, close   float64
+		volume int64
+	Slicing com [a:b] devolve outro Bars que é apenas uma view dos mesmos arrays (sem cópia).
+	Indexar com um inteiro devolve o dict antigo {'time':datetime, 'open':...}, de forma que o
+	código que espera a list de dicts continua funcionando (compat view).
+	------------------------------------------------------------------------------------------
+	Exemplo: b = Bars.fromDicts(data)
+			 b[0]['time'], b.high[:10].max()
+	------------------------------------------------------------------------------------------
+	'''
+	COLUMNS = ('time', 'open', 'high', 'low', 'close', 'volume')
+
+	def __init__(self, time, open, high, low, close, volume):
+		self.time = np.asarray(time, dtype='int64')
+		self.open = np.asarray(open, dtype='float64')
+		self.high = np.asarray(high, dtype='float64')
+		self.low = np.asarray(low, dtype='float64')
+		self.close = np.asarray(close, dtype='float64')
+		self.volume = np.asarray(volume, dtype='int64')
+
+	@classmethod
+	def fromDicts(cls, bl):
+		'''
+		bl: bar list no formato antigo, uma list de dicts com 'time' sendo datetime
+		'''
+		return cls([toEpochMinute(b['time']) for b in bl],
+					[b['open'] for b in bl],
+					[b['high'] for b in bl],
+					[b['low'] for b in bl],
+					[b['close'] for b in bl],
+					[b['volume'] for b in bl])
+
+	@classmethod
+	def empty(cls):
+		return cls([], [], [], [], [], [])
+
+	def toDicts(self):
+		return [self.bar(i) for i in range(len(self))]
+
+	def bar(self, i):
+		'''
+		devolve a barra i como o dict antigo
+		'''
+		return {'time': fromEpochMinute(self.time[i]),
+				'open': float(self.open[i]),
+				'high': float(self.high[i]),
+				'low': float(self.low[i]),
+				'close': float(self.close[i]),
+				'volume': int(self.volume[i])}
+
+	def __len__(self):
+		return len(self.time)
+
+	def __getitem__(self, i):
+		if isinstance(i, slice):
+			return Bars(self.time[i], self.open[i], self.high[i], self.low[i], self.close[i], self.volume[i])
+		return self.bar(i)
+
+	def __iter__(self): # iterar devolve dicts, igual à list antiga
+		for i in range(len(self)):
+			yield self.bar(i)
+
+	def days(self):
+		'''
+		dia (epoch-day) de cada barra
+		'''
+		return self.time//MINUTES_PER_DAY
+
+	def minuteOfDay(self):
+		'''
+		minuto do dia de cada barra, 9:30 é 570 e 16:00 é 960
+		'''
+		return self.time % MINUTES_PER_DAY
+
+	def dayOffsets(self):
+		'''
+		devolve um array com len(dias)+1 posições, onde o dia k ocupa as barras
+		offsets[k]:offsets[k+1]. Assume que as barras estão em ordem cronológica.
+		'''
+		if len(self) == 0:
+			return np.zeros(1, dtype='int64')
+		d = self.days()
+		starts = np.flatnonzero(d[1:] != d[:-1]) + 1
+		return np.concatenate(([0], starts, [len(self)])).astype('int64')
+
+	def dayIndex(self):
+		'''
+		índice data -> range de linhas: devolve (days, offsets), onde days[k] é o epoch-day do k-ésimo
+		dia presente nos dados e as barras dele são offsets[k]:offsets[k+1]
+		como days é ordenado, achar um dia é um searchsorted, O(log n)
+		'''
+		offsets = self.dayOffsets()
+		return self.time[offsets[:-1]]//MINUTES_PER_DAY, offsets
+
+	def __repr__(self):
+		if len(self) == 0:
+			return 'Bars([])'
+		return f"Bars({len(self)} barras de {fromEpochMinute(self.time[0])} até {fromEpochMinute(self.time[-1])})"
@@ -0,0 +1,504 @@
+import numpy as np
+import datetime
+import tempfile
+import time
+import os
+import json
+import subprocess
+import pandas as pd
+from Bars import Bars, readBarsCsv
+from Ativo import sessionBounds, dayStats, DAY_STATS
+from AtivoDia import AtivoDiaTable, STATS, TIME_STATS, INT_STATS, timeToMinute
+from Utilities import divideDays, drawdown, maxDrawdowns
+
+
+def writeSyntheticCsv(path, rows, seed=0, start=datetime.datetime(2015,1,2,4,0)):
+	'''
+	escreve um csv sintético no mesmo formato dos arquivos de data_dist:
+	header time,open,high,low,close,volume e as linhas do mais recente pro mais antigo
+	uma barra por minuto, só pra ter volume de dados, sem nenhuma preocupação com realismo
+	'''
+	rng = np.random.default_rng(seed)
+	t = np.datetime64(start, 'm') + np.arange(rows)
+	ts = np.char.replace(np.datetime_as_string(t, unit='s'), 'T', ' ')
+	close = np.maximum(5*np.cumprod(1 + rng.normal(0, 0.002, rows)), 0.01)
+	opn = close*(1 + rng.normal(0, 0.001, rows))
+	high = np.maximum(opn, close)*(1 + abs(rng.normal(0, 0.001, rows)))
+	low = np.minimum(opn, close)*(1 - abs(rng.normal(0, 0.001, rows)))
+	volume = rng.integers(100, 100000, rows)
+
+	with open(path, 'w') as file:
+		file.write('time,open,high,low,close,volume\n')
+		for i in range(rows-1, -1, -1):
+			file.write(f"{ts[i]},{opn[i]:.4f},{high[i]:.4f},{low[i]:.4f},{close[i]:.4f},{volume[i]}\n")
+
+def legacyReadCsv(path):
+	'''
+	o loop antigo de Ativo.__init__ (readline, split, strptime e um dict por barra), mantido só como referência
+	'''
+	data = []
+	with open(path, 'r') as file:
+	    line = file.readline()
+	    line = file.readline()
+	    while line:
+	        tokens = line.split(',')
+	        bar = { 'time':datetime.datetime.strptime(tokens[0], '%Y-%m-%d %H:%M:%S'),
+	                'open':float(tokens[1]),
+	                'high':float(tokens[2]),
+	                'low':float(tokens[3]),
+	                'close':float(tokens[4]),
+	                'volume':int(tokens[5])}
+	        data.append(bar)
+	        line = file.readline()
+	data.reverse()
+	return data
+
+def benchIngest(rows=1000000, path=None):
+	'''
+	compara o loop antigo com readBarsCsv num arquivo sintético de rows linhas
+	devolve um dict com os tempos em segundos
+	'''
+	tmpdir = None
+	if path is None:
+		tmpdir = tempfile.TemporaryDirectory()
+		path = os.path.join(tmpdir.name, 'SYNTH.csv')
+	if not os.path.exists(path):
+		writeSyntheticCsv(path, rows)
+
+	start = time.perf_counter()
+	legacy = legacyReadCsv(path)
+	t_legacy = time.perf_counter() - start
+
+	start = time.perf_counter()
+	bars = readBarsCsv(path)
+	t_bars = time.perf_counter() - start
+
+	# confere que os dois caminhos dão exatamente os mesmos dados
+	ref = Bars.fromDicts(legacy)
+	same = all(np.array_equal(getattr(ref, c), getattr(bars, c)) for c in Bars.COLUMNS)
+
+	if tmpdir is not None:
+		tmpdir.cleanup()
+
+	res = {'rows': len(bars), 'legacy_s': t_legacy, 'readBarsCsv_s': t_bars,
+			'speedup': t_legacy/t_bars, 'identical': same}
+	print(f"{res['rows']} linhas: loop antigo {t_legacy:.2f}s, readBarsCsv {t_bars:.2f}s "
+		  f"({res['speedup']:.1f}x), dados idênticos: {same}")
+	return res
+
+def syntheticBars(days=252, seed=0, start=datetime.date(2019,1,2)):
+	'''
+	Bars sintético com days dias úteis de barras de 1 minuto das 4:00 às 19:59 (pre, core e pós completos)
+	'''
+	rng = np.random.default_rng(seed)
+	dates = np.busday_offset(np.datetime64(start, 'D'), np.arange(days), roll='forward')
+	minutes = np.arange(4*60, 20*60)
+	t = (dates.astype('datetime64[m]')[:,None] + minutes[None,:]).ravel()
+	rows = len(t)
+	close = np.maximum(5*np.cumprod(1 + rng.normal(0, 0.002, rows)), 0.01)
+	opn = close*(1 + rng.normal(0, 0.001, rows))
+	high = np.maximum(opn, close)*(1 + abs(rng.normal(0, 0.001, rows)))
+	low = np.minimum(opn, close)*(1 - abs(rng.normal(0, 0.001, rows)))
+	return Bars(t.astype('int64'), opn, high, low, close, rng.integers(100, 100000, rows))
+
+def legacyIntradayStats(dataDay):
+	'''
+	o split de sessões e as stats do IntraDay antigo (um dict por barra, datetime.time por barra e
+	list.index dentro dos loops), mantido só como referência
+	'''
+	pre, core = [], []
+	for dt in dataDay:
+		if dt['time'].time() <= datetime.time(9,30):
+			pre.append(dt)
+		elif datetime.time(9,30) < dt['time'].time() <= datetime.time(16,0):
+			core.append(dt)
+	stats = {}
+	stats['volPre'] = sum(b['volume'] for b in pre)
+	moneyVolPre = 0
+	for b in pre:
+		moneyVolPre += b['volume']*b['close']
+	stats['moneyVolPre'] = moneyVolPre
+	stats['openValue'] = core[0]['open']
+	highCoreValue, highCoreTime, highCorePosition = core[0]['high'], core[0]['time'].time(), 0
+	for b in core:
+		if highCoreValue < b['high']:
+			highCoreValue, highCoreTime, highCorePosition = b['high'], b['time'].time(), core.index(b)
+	stats['highCoreValue'], stats['highCoreTime'], stats['highCorePosition'] = highCoreValue, highCoreTime, highCorePosition
+	low, lowTime, lowPosition = core[highCorePosition]['high'], core[highCorePosition]['time'].time(), highCorePosition
+	for b in core[highCorePosition:]:
+		if low > b['low']:
+			low, lowTime, lowPosition = b['low'], b['time'].time(), core.index(b)
+	stats['lowAfterHighValue'], stats['lowAfterHighTime'], stats['lowPositionAfterHigh'] = low, lowTime, lowPosition
+	stats['openToSpikePercent'] = (highCoreValue - stats['openValue'])/stats['openValue']
+	stats['spikeToLowPercent'] = (low - highCoreValue)/highCoreValue
+	stats['volumeToSpike'] = sum(b['volume'] for b in core[:highCorePosition+1])
+	stats['spikeToPreVolFactor'] = stats['volumeToSpike']/stats['volPre'] if stats['volPre'] else 0
+	return stats
+
+def benchStats(days=252):
+	'''
+	compara as stats do IntraDay antigo (dia a dia, sobre dicts) com sessionBounds + dayStats (todos os
+	dias do ticker de uma vez) em days dias de barras de 1 minuto
+	devolve um dict com os tempos em segundos
+	'''
+	bars = syntheticBars(days)
+	dicts = [bars.toDicts() for bars in divideDays(bars)] # a conversão pra dicts não entra no tempo
+
+	start = time.perf_counter()
+	legacy = [legacyIntradayStats(d) for d in dicts]
+	t_legacy = time.perf_counter() - start
+
+	start = time.perf_counter()
+	stats = dayStats(bars, sessionBounds(bars))
+	t_kernel = time.perf_counter() - start
+
+	# confere os resultados; moneyVolPre é uma soma de floats e pode mudar na última casa pela ordem da soma
+	same = True
+	for s in DAY_STATS:
+		ref = np.array([timeToMinute(l[s]) if isinstance(l[s], datetime.time) else l[s] for l in legacy])
+		same &= bool(np.allclose(ref, stats[s], rtol=1e-12, atol=0) if s == 'moneyVolPre' else np.array_equal(ref, stats[s]))
+
+	res = {'rows': len(bars), 'days': days, 'legacy_s': t_legacy, 'dayStats_s': t_kernel,
+			'speedup': t_legacy/t_kernel, 'identical': same}
+	print(f"{days} dias ({res['rows']} barras): IntraDay antigo {t_legacy:.2f}s, dayStats {t_kernel:.4f}s "
+		  f"({res['speedup']:.0f}x), mesmas stats: {same}")
+	return res
+
+def legacyDrawdown(s):
+	'''
+	o drawdown antigo em O(n²) (máximo de s[:i+1] a cada ponto), mantido só como referência;
+	Series.append não existe mais no pandas, então o acúmulo usa pd.concat, com o mesmo resultado
+	'''
+	s = pd.Series(s, dtype='float64').reset_index(drop=True)
+	dd = pd.Series(dtype='float64')
+	for i in s.index:
+		_dd = s[i]/max(s[:i+1].max(),1)-1
+		dd = pd.concat([dd, pd.Series([_dd])], ignore_index=True)
+	return abs( dd.min() )
+
+def benchDrawdown(n=2000, paths=50, seed=0):
+	'''
+	confere drawdown e maxDrawdowns contra legacyDrawdown em curvas de equity de profits aleatórios
+	(incluindo curvas abaixo de 1, onde vale o piso max(pico, 1), curvas só caindo, valores negativos
+	e a série vazia) e mede o tempo das duas versões numa curva de n pontos
+	'''
+	rng = np.random.default_rng(seed)
+	cases = [np.zeros(0), np.array([0.5]), np.array([2.0])]
+	for size in (1, 2, 10, 100, 300):
+		cases.append(np.cumprod(1 + rng.normal(0, 0.05, size))) # em torno de 1, cruzando o piso
+		cases.append(0.5*np.cumprod(1 + rng.normal(0, 0.05, size))) # sempre abaixo de 1, só o piso conta
+		cases.append(np.cumprod(1 - rng.uniform(0, 0.1, size))) # só perdas
+		cases.append(-rng.uniform(0, 1, size)) # valores negativos
+	for c in cases:
+		ref = legacyDrawdown(c)
+		assert drawdown(c) == ref or (np.isnan(ref) and np.isnan(drawdown(c))), (c, ref, drawdown(c))
+
+	m = 2*np.cumprod(1 + rng.normal(0, 0.05, (paths, 300)), axis=1)
+	assert np.array_equal(maxDrawdowns(m), [legacyDrawdown(row) for row in m])
+	assert np.isnan(maxDrawdowns(np.zeros((3, 0)))).all()
+
+	curve = np.cumprod(1 + rng.normal(0, 0.02, n))
+	start = time.perf_counter()
+	ref = legacyDrawdown(curve)
+	t_legacy = time.perf_counter() - start
+	start = time.perf_counter()
+	new = drawdown(curve)
+	t_new = time.perf_counter() - start
+	res = {'points': n, 'legacy_s': t_legacy, 'drawdown_s': t_new, 'speedup': t_legacy/t_new,
+			'identical': bool(ref == new)}
+	print(f"drawdown com {n} pontos: antigo {t_legacy:.2f}s, novo {t_new:.5f}s ({res['speedup']:.0f}x), "
+		  f"{len(cases)} casos e {paths} caminhos iguais à referência")
+	return res
+
+def syntheticTable(n, seed=0):
+	'''
+	AtivoDiaTable sintética com n ativo-dias e valores aleatórios, só pra ter volume de dados
+	'''
+	rng = np.random.default_rng(seed)
+	cols = {'name': np.array([f"T{i}" for i in rng.integers(0, 3000, n)]),
+			'date': np.datetime64('2015-01-02') + rng.integers(0, 2000, n).astype('timedelta64[D]'),
+			'freefloat': rng.integers(10**6, 10**8, n).astype('float64')}
+	for s in STATS:
+		if s in TIME_STATS:
+			cols[s] = rng.integers(9*60+31, 16*60+1, n)
+		elif s in INT_STATS:
+			cols[s] = rng.integers(0, 10**7, n)
+		else:
+			cols[s] = rng.normal(0, 1, n)
+	return AtivoDiaTable(cols)
+
+def syntheticTrades(n, seed=0):
+	'''
+	n trades sintéticos no formato de TradesAnalyser.trades (um a cada 10 dias sem trade)
+	as barras de entrada e saída vêm de um conjunto pequeno de dicts, pra lista caber na memória
+	'''
+	rng = np.random.default_rng(seed)
+	day = datetime.datetime(2020,1,2)
+	bars = [{'time':day + datetime.timedelta(minutes=m), 'open':1.0, 'high':1.1, 'low':0.9, 'close':1.0, 'volume':100}
+			for m in range(9*60+31, 16*60+1)]
+	entry = rng.integers(0, len(bars)-1, n)
+	profit = rng.normal(0, 0.05, n)
+	dates = [day.date() + datetime.timedelta(days=int(d)) for d in rng.integers(0, 2000, n)]
+	trades = []
+	for i in range(n):
+		trade = None
+		if i % 10:
+			trade = {'entry':bars[entry[i]], 'price':1.1, 'stop':1.2, 'target':1.0,
+					'exit':bars[entry[i]+1], 'profit':float(profit[i])}
+		trades.append({'name':'T', 'date':dates[i], 'trade':trade})
+	return trades
+
+def benchReports(days=100000, trades=1000000):
+	'''
+	tempo de getFilteredDays e getTrades (montagem do DataFrame de trades com a equity) com days ativo-dias
+	filtrados e trades trades, e com um décimo disso, pra ver que o tempo cresce linearmente
+	precisa do names.txt, como o TradesAnalyser (o arquivo de free float não é lido)
+	'''
+	import TradesAnalyser as ta
+	res = {}
+	for scale in (10, 1):
+		n_days, n_trades = days//scale, trades//scale
+		an = ta.TradesAnalyser(syntheticTable(n_days))
+		an.fad_idx = np.arange(n_days)
+		start = time.perf_counter()
+		an.getFilteredDays()
+		res[f"getFilteredDays_{n_days}_s"] = time.perf_counter() - start
+
+		an.trades = syntheticTrades(n_trades)
+		start = time.perf_counter()
+		an.getTrades()
+		res[f"getTrades_{n_trades}_s"] = time.perf_counter() - start
+
+	for name, n in (('getFilteredDays', days), ('getTrades', trades)):
+		small, big = res[f"{name}_{n//10}_s"], res[f"{name}_{n}_s"]
+		print(f"{name}: {n//10} linhas {small:.2f}s, {n} linhas {big:.2f}s ({big/small:.1f}x para 10x mais linhas)")
+	return res
+
+def writeSyntheticTicker(path, days=60, seed=0, start=datetime.date(2020,1,2), pre=True, core=True, post=True,
+						gap_prob=0.2, spike_prob=0.3):
+	'''
+	Escreve o csv de um ticker sintético no formato exato dos arquivos de data_dist (header
+	time,open,high,low,close,volume e linhas do mais recente pro mais antigo), com days dias úteis.
+	pre, core e post escolhem quais sessões têm barras (4:00-9:30, 9:31-16:00, 16:01-20:00).
+	Com probabilidade gap_prob o dia abre com gap de alta (20% a 100%, e volume de pre maior), senão o
+	gap é pequeno; com probabilidade spike_prob o core tem um spike (10% a 60% acima do open, num minuto
+	aleatório, seguido de queda), que é o que a estratégia procura.
+	Depois de um dia com gap de alta ou spike o preço volta para o nível de antes, como costuma acontecer
+	com esses papéis, então os preços não crescem sem limite e os filtros de open e de volume de pre se
+	comportam como nos dados reais.
+	'''
+	rng = np.random.default_rng(seed)
+	sessions = ([np.arange(4*60, 9*60+31)] if pre else []) + ([np.arange(9*60+31, 16*60+1)] if core else []) + \
+				([np.arange(16*60+1, 20*60+1)] if post else [])
+	minutes = np.concatenate(sessions)
+	coreMask = (minutes > 9*60+30) & (minutes <= 16*60)
+	preMask = minutes <= 9*60+30
+	dates = np.busday_offset(np.datetime64(start, 'D'), np.arange(days), roll='forward')
+
+	price = 5.0 # nível do papel, só segue o fechamento nos dias normais
+	parts = []
+	for d in dates:
+		gapDay = rng.random() < gap_prob
+		gap = rng.uniform(0.2, 1.0) if gapDay else rng.normal(0, 0.02)
+		spikeDay = False
+		base = price*(1 + gap)*np.cumprod(1 + rng.normal(0, 0.002, len(minutes)))
+		if rng.random() < spike_prob and coreMask.any():
+			idx = np.flatnonzero(coreMask)
+			peak = rng.integers(idx[0], idx[-1] + 1)
+			spikeDay = True
+			height = rng.uniform(0.1, 0.6)
+			# sobe até o pico e depois devolve metade do movimento até o fim do dia
+			up = np.clip((np.arange(len(minutes)) - idx[0])/max(peak - idx[0], 1), 0, 1)
+			down = np.clip((np.arange(len(minutes)) - peak)/max(idx[-1] - peak, 1), 0, 1)
+			base = base*(1 + height*(up - 0.5*down)*(np.arange(len(minutes)) >= idx[0]))
+		close = np.maximum(base, 0.01)
+		opn = np.concatenate(([close[0]], close[:-1]))
+		high = np.maximum(opn, close)*(1 + abs(rng.normal(0, 0.001, len(minutes))))
+		low = np.minimum(opn, close)*(1 - abs(rng.normal(0, 0.001, len(minutes))))
+		volume = rng.integers(100, 10000, len(minutes))*np.where(preMask & (gap > 0.1), 20, 1)
+		t = d.astype('datetime64[m]') + minutes
+		parts.append(pd.DataFrame({'time':np.char.replace(np.datetime_as_string(t, unit='s'), 'T', ' '),
+									'open':opn, 'high':high, 'low':low, 'close':close, 'volume':volume}))
+		if not (gapDay or spikeDay):
+			price = close[-1]
+
+	df = pd.concat(parts, ignore_index=True).iloc[::-1]
+	df.to_csv(path, index=False, float_format='%.4f', lineterminator='\n')
+
+def writeSyntheticUniverse(workdir, tickers=10, days=60, seed=0, **kw):
+	'''
+	universo sintético em workdir: um csv por ticker em data/<ticker>/<ticker>.csv, o names.txt no mesmo
+	formato do original (ticker,<ticker>\\<ticker>.csv) e um arquivo de free float com as colunas Ticker e
+	Shares Float; kw vai para writeSyntheticTicker
+	devolve a lista de tickers
+	'''
+	names = [f"T{i:04d}" for i in range(tickers)]
+	for k, name in enumerate(names):
+		os.makedirs(os.path.join(workdir, 'data', name), exist_ok=True)
+		writeSyntheticTicker(os.path.join(workdir, 'data', name, name + '.csv'), days, seed + k, **kw)
+	with open(os.path.join(workdir, 'names.txt'), 'w') as file:
+		file.writelines(f"{name},{name}\\{name}.csv\n" for name in names)
+	rng = np.random.default_rng(seed)
+	pd.DataFrame({'Ticker':names, 'Sector':'Synthetic',
+				'Shares Float':rng.integers(10**6, 10**8, tickers)}).to_csv(os.path.join(workdir, 'america_2020-11-28.csv'), index=False)
+	return names
+
+def gitCommit():
+	'''
+	commit atual do repositório (hash curto, com + se tiver alterações não commitadas), ou 'unknown'
+	'''
+	here = os.path.dirname(os.path.abspath(__file__))
+	try:
+		commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=here, capture_output=True,
+								text=True, check=True).stdout.strip()
+		dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=here,
+								capture_output=True, text=True, check=True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return 'unknown'
+	return commit + ('+' if dirty else '')
+
+def _fileManager(workdir):
+	# FileManager do universo sintético, com tudo dentro de workdir
+	import FileManager as fman
+	return fman.FileManager(os.path.join(workdir, 'bar_cache'), root=os.path.join(workdir, 'data'),
+							names=os.path.join(workdir, 'names.txt'),
+							freefloat_file=os.path.join(workdir, 'america_2020-11-28.csv'))
+
+def benchPipeline(scales=((10, 60), (20, 250)), workdir=None, results='benchmarks.json', seed=0,
+				grid=None):
+	'''
+	Mede cada estágio do pipeline em universos sintéticos de (tickers, dias) em scales:
+	parse dos csvs, cache binário, montagem da tabela de ativo-dias, runFiltering, runSimulation, getTrades,
+	runBootstrap e um runSimulationGroup com grid (por padrão 8 combinações).
+	Os resultados vão para results (json), numa lista por commit (gitCommit), para comparar commits;
+	devolve um DataFrame com uma linha por escala.
+	'''
+	import TradesAnalyser as ta
+	from AtivoDia import AtivoDiaTable, iterAtivoDiaBlocks
+	if grid is None:
+		grid = dict(prevol_threshold=[0, 100000], open_dolar_threshold=[0], gap_threshold=[0.1, 0.2],
+					F_high_threshold=[1000], short_after=[0.1], exit_target=[0.1, 0.2], exit_stop=[0.2])
+
+	rows = []
+	for tickers, days in scales:
+		tmpdir = None
+		d = workdir
+		if d is None:
+			tmpdir = tempfile.TemporaryDirectory()
+			d = tmpdir.name
+		d = os.path.join(d, f"{tickers}x{days}")
+		os.makedirs(d, exist_ok=True)
+		row = {'tickers':tickers, 'days':days}
+		try:
+			start = time.perf_counter()
+			names = writeSyntheticUniverse(d, tickers, days, seed)
+			row['generate_s'] = time.perf_counter() - start
+			fm = _fileManager(d)
+
+			start = time.perf_counter()
+			row['rows'] = sum(len(readBarsCsv(fm[n])) for n in names)
+			row['csv_parse_s'] = time.perf_counter() - start
+
+			start = time.perf_counter()
+			for n in names:
+				fm.getBars(n)
+			row['bar_cache_s'] = time.perf_counter() - start
+
+			start = time.perf_counter()
+			blocks = list(iterAtivoDiaBlocks(fm, workers=0))
+			adt = AtivoDiaTable({c: np.concatenate([b[c] for b in blocks]) for c in blocks[0]})
+			row['ativo_dias'] = len(adt)
+			row['ativo_dia_build_s'] = time.perf_counter() - start
+
+			an = ta.TradesAnalyser(adt, fm=fm)
+			an.setFilterParameters(prevol_threshold=0, open_dolar_threshold=0, gap_threshold=0.1, F_high_threshold=1000)
+			an.setAlgoParameters(short_after=0.1, exit_target=0.2, exit_stop=0.2)
+			for stage, f in (('runFiltering', an.runFiltering), ('runSimulation', an.runSimulation),
+							('getTrades', an.getTrades), ('runBootstrap', an.runBootstrap)):
+				start = time.perf_counter()
+				f()
+				row[stage + '_s'] = time.perf_counter() - start
+			row['filtered'] = len(an.fad)
+			row['trades'] = an.n_trades
+
+			an.loader.clear() # o grupo começa sem dias carregados, como numa sessão nova
+			start = time.perf_counter()
+			an.runSimulationGroup(**grid)
+			row['runSimulationGroup_s'] = time.perf_counter() - start
+			row['combos'] = len(an.results)
+		finally:
+			if tmpdir is not None:
+				tmpdir.cleanup()
+		rows.append(row)
+
+	df = pd.DataFrame(rows)
+	if results is not None:
+		store = {}
+		if os.path.exists(results):
+			with open(results, 'r') as file:
+				store = json.load(file)
+		store.setdefault(gitCommit(), []).append({'time':datetime.datetime.now().isoformat(timespec='seconds'),
+												'runs':df.to_dict(orient='records')})
+		with open(results, 'w') as file:
+			json.dump(store, file, indent=1)
+	return df
+
+def compareBenchmarks(results='benchmarks.json', stage='runSimulationGroup_s'):
+	'''
+	tabela com o tempo de stage (última medição de cada commit) por escala (tickers x dias) e commit
+	'''
+	with open(results, 'r') as file:
+		store = json.load(file)
+	cols = {}
+	for commit, measurements in store.items():
+		runs = measurements[-1]['runs']
+		cols[commit] = {f"{r['tickers']}x{r['days']}": r.get(stage) for r in runs}
+	return pd.DataFrame(cols)
+
+def benchFreeFloat(snapshots=36, tickers=5000, rows=1000000, seed=0):
+	'''
+	tempo de ingestão de snapshots sintéticos do screener (um por mês, com tickers entrando e saindo),
+	de montagem do índice e de FreeFloatHistory.asOf para rows (ticker, dia) aleatórios, conferindo
+	uma amostra contra uma busca linear
+	'''
+	from FreeFloat import FreeFloatHistory
+	rng = np.random.default_rng(seed)
+	names = np.array([f"T{i:05d}" for i in range(tickers)])
+	res = {}
+	with tempfile.TemporaryDirectory() as d:
+		snap_dates = [datetime.date(2018 + m//12, m%12 + 1, 1) for m in range(snapshots)]
+		for k, sd in enumerate(snap_dates):
+			present = rng.random(tickers) < 0.9
+			pd.DataFrame({'Ticker':names[present], 'Shares Float':rng.integers(10**6, 10**8, present.sum()),
+						'Price':rng.random(present.sum())}).to_csv(os.path.join(d, f"america_{sd}.csv"), index=False)
+
+		ffh = FreeFloatHistory(os.path.join(d, 'freefloat.cols'))
+		start = time.perf_counter()
+		ffh.ingestDir(d)
+		res['ingest_s'] = time.perf_counter() - start
+		start = time.perf_counter()
+		len(ffh)
+		res['index_s'] = time.perf_counter() - start
+
+		q_names = names[rng.integers(0, tickers, rows)]
+		q_dates = np.datetime64('2017-06-01') + rng.integers(0, 365*(snapshots//12 + 2), rows).astype('timedelta64[D]')
+		start = time.perf_counter()
+		ff = ffh.asOf(q_names, q_dates)
+		res[f"asOf_{rows}_s"] = time.perf_counter() - start
+
+		cols = ffh.store.read()
+		for i in rng.integers(0, rows, 200):
+			m = (cols['name'] == q_names[i]) & (cols['date'] <= q_dates[i])
+			ref = cols['freefloat'][m][np.argmax(cols['date'][m])] if m.any() else np.nan
+			assert ref == ff[i] or (np.isnan(ref) and np.isnan(ff[i]))
+	print(res)
+	return res
+
+
+if __name__ == '__main__':
+	benchIngest()
+	benchStats()
+	benchDrawdown()
+	benchReports()
+	print(benchPipeline())
+	benchFreeFloat()
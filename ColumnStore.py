@@ -0,0 +1,87 @@
+import numpy as np
+import json
+import os
+
+
+class ColumnStore():
+	'''
+	Arquivo colunar simples em disco: um diretório com um .npy por coluna e por chunk
+	(path/<coluna>/<chunk>.npy) e um meta.json com a lista de colunas e o número de chunks completos.
+	append() grava um chunk novo sem reescrever os anteriores, e a leitura usa mmap e pode pedir
+	só algumas colunas (projeção). O meta.json só é atualizado depois que todas as colunas do chunk
+	foram gravadas, então um append interrompido no meio não aparece na leitura.
+	------------------------------------------------------------------------------------------
+	Exemplo: store = ColumnStore('ativo_dias.cols')
+			 store.append({'name': np.array(['AAMC']), 'gap': np.array([0.25])})
+			 store.read(['gap'])
+	------------------------------------------------------------------------------------------
+	'''
+	def __init__(self, path):
+		self.path = path
+		self.meta = {'columns': [], 'chunks': 0}
+		meta = os.path.join(path, 'meta.json')
+		if os.path.exists(meta):
+			with open(meta, 'r') as file:
+				self.meta = json.load(file)
+
+	def __len__(self):
+		return self.meta['chunks']
+
+	def columns(self):
+		return list(self.meta['columns'])
+
+	def _file(self, column, k):
+		return os.path.join(self.path, column, f"{k:06d}.npy")
+
+	def append(self, columns):
+		'''
+		columns: dict nome -> array, todos com o mesmo tamanho
+		'''
+		if self.meta['chunks'] and set(columns) != set(self.meta['columns']):
+			raise ValueError(f"colunas {sorted(columns)} diferentes das do arquivo {sorted(self.meta['columns'])}")
+		k = self.meta['chunks']
+		for c, values in columns.items():
+			os.makedirs(os.path.join(self.path, c), exist_ok=True)
+			values = np.asarray(values)
+			# dtype.str descarta metadados que o dtype possa ter ganho no pickle entre processos
+			np.save(self._file(c, k), values.view(np.dtype(values.dtype.str)))
+
+		meta = {'columns': list(columns), 'chunks': k + 1}
+		tmp = os.path.join(self.path, 'meta.json.tmp')
+		with open(tmp, 'w') as file:
+			json.dump(meta, file)
+		os.replace(tmp, os.path.join(self.path, 'meta.json'))
+		self.meta = meta
+
+	def clear(self):
+		'''
+		apaga os dados (o meta.json primeiro, então um clear interrompido deixa o arquivo vazio)
+		'''
+		meta = os.path.join(self.path, 'meta.json')
+		if os.path.exists(meta):
+			os.remove(meta)
+		for c in self.meta['columns']:
+			for k in range(self.meta['chunks']):
+				if os.path.exists(self._file(c, k)):
+					os.remove(self._file(c, k))
+		self.meta = {'columns': [], 'chunks': 0}
+
+	def chunks(self, columns=None, mmap=True):
+		'''
+		gerador com um dict de arrays por chunk, só com as colunas pedidas
+		'''
+		columns = self.columns() if columns is None else columns
+		for k in range(self.meta['chunks']):
+			yield {c: np.load(self._file(c, k), mmap_mode='r' if mmap else None) for c in columns}
+
+	def read(self, columns=None):
+		'''
+		todas as linhas das colunas pedidas, concatenando os chunks
+		'''
+		columns = self.columns() if columns is None else columns
+		parts = list(self.chunks(columns))
+		if not parts:
+			return {c: np.zeros(0) for c in columns}
+		if len(parts) == 1:
+			return parts[0]
+		return {c: np.concatenate([p[c] for p in parts]) for c in columns}
@@ -1,4 +1,99 @@
 import pandas as pd
+import numpy as np
+import json
+import os
+from Bars import Bars, readBarsCsv, toEpochDay
+
+
+class BarCache():
+	'''
+	Cache binário das barras de cada ticker.
+	Na primeira vez que um ticker é aberto o csv é parseado e cada coluna do Bars é salva como um .npy
+	em root/<ticker>/. Nas próximas vezes as colunas são abertas com mmap, ou seja, abrir o ticker
+	custa quase nada e o sistema operacional só lê do disco as páginas (dias) que forem usadas.
+	O cache é refeito sempre que o mtime ou o tamanho do csv original mudarem.
+	Junto com as colunas é salvo um índice de datas (days.npy e offsets.npy), de forma que carregar
+	um único dia é um searchsorted mais um slice das colunas mapeadas.
+	------------------------------------------------------------------------------------------
+	Exemplo: cache = BarCache('bar_cache')
+			 bars = cache.load('AAMC', fm['AAMC'])
+	------------------------------------------------------------------------------------------
+	'''
+	VERSION = 2 # incrementar se o formato mudar, para invalidar caches antigos
+
+	def __init__(self, root='bar_cache'):
+		self.root = root
+
+	def _dir(self, name):
+		return os.path.join(self.root, name)
+
+	def _source(self, path):
+		st = os.stat(path)
+		return {'version':self.VERSION, 'mtime':st.st_mtime_ns, 'size':st.st_size}
+
+	def isValid(self, name, path):
+		try:
+			with open(os.path.join(self._dir(name), 'meta.json'), 'r') as file:
+				meta = json.load(file)
+		except (OSError, ValueError):
+			return False
+		return all(meta.get(k) == v for k, v in self._source(path).items())
+
+	def load(self, name, path):
+		if not self.isValid(name, path):
+			self.store(name, path, readBarsCsv(path))
+		d = self._dir(name)
+		return Bars(*[np.load(os.path.join(d, c + '.npy'), mmap_mode='r') for c in Bars.COLUMNS])
+
+	def loadIndex(self, name, path):
+		'''
+		devolve (days, offsets), ver Bars.dayIndex
+		'''
+		if not self.isValid(name, path):
+			self.store(name, path, readBarsCsv(path))
+		d = self._dir(name)
+		return np.load(os.path.join(d, 'days.npy')), np.load(os.path.join(d, 'offsets.npy'))
+
+	def loadDay(self, name, path, day):
+		'''
+		devolve o Bars de um único dia (datetime.date), ou None se o ticker não tiver dados nesse dia
+		'''
+		days, offsets = self.loadIndex(name, path)
+		k = np.searchsorted(days, toEpochDay(day))
+		if k == len(days) or days[k] != toEpochDay(day):
+			return None
+		return self.load(name, path)[offsets[k]:offsets[k+1]]
+
+	def store(self, name, path, bars):
+		d = self._dir(name)
+		os.makedirs(d, exist_ok=True)
+		meta = os.path.join(d, 'meta.json')
+		# o meta.json é apagado antes e escrito por último, então um cache pela metade nunca é considerado válido
+		if os.path.exists(meta):
+			os.remove(meta)
+		for c in Bars.COLUMNS:
+			np.save(os.path.join(d, c + '.npy'), getattr(bars, c))
+		days, offsets = bars.dayIndex()
+		np.save(os.path.join(d, 'days.npy'), days)
+		np.save(os.path.join(d, 'offsets.npy'), offsets)
+		with open(meta, 'w') as file:
+			json.dump(dict(self._source(path), rows=len(bars)), file)
+
+	def clear(self, name):
+		meta = os.path.join(self._dir(name), 'meta.json')
+		if os.path.exists(meta):
+			os.remove(meta)
+
+
+# root padrão dos csvs, o mesmo de sempre (relativo ao diretório de trabalho), em formato portável
+# pode ser trocado por FileManager(root=...) ou pela variável de ambiente DATA_ROOT
+DATA_ROOT = os.path.join('..', '..', '..', 'Data', 'data_dist')
+
+def normPath(root, path):
+	'''
+	junta root com um path de names.txt, que usa \\ como separador (Windows), no separador do sistema
+	'''
+	return os.path.join(root, *path.replace('\\', '/').split('/'))
 
 
 class FileManager():
@@ -6,31 +101,63 @@ class FileManager():
 	Organiza os nomes e os paths de cada arquivo.
 	Permite descobrir o path de um arquivo usando o seu ticker
 	Como tarefa adicional, organiza arquivos auxiliares como o arquivo com free_floats
+	root é o diretório dos csvs (por padrão DATA_ROOT, ou a variável de ambiente DATA_ROOT), names o
+	arquivo com os pares ticker,path e freefloat_file o arquivo de free float, que só é lido no primeiro
+	uso (freeFloat, getFreeFloat). FileManager.shared() devolve uma instância única por processo para
+	cada configuração, e é o que o TradesAnalyser usa.
 	------------------------------------------------------------------------------------------
-	Exemplo: fm = fman.FileManager()
+	Exemplo: fm = fman.FileManager.shared()
 			 fm['AAMC']
+			 fm.getBars('AAMC') # barras do ticker, via cache binário
 	------------------------------------------------------------------------------------------
 	'''
-	def __init__(self):
+	_shared = {} # configuração -> instância, ver shared()
+
+	def __init__(self, cache_root='bar_cache', root=None, names='names.txt', freefloat_file='america_2020-11-28.csv'):
 
-		self.ticker = dict()
-		root = '..\\..\\..\\Data\\data_dist\\'
+		if root is None:
+			root = os.environ.get('DATA_ROOT', DATA_ROOT)
+		self.root = root
+		self.names = names
+		self.freefloat_file = freefloat_file
 
 		# names.txt contem os pares nome_do_ticker endereço_do_csv
 		# names é para que ele não use a primeira row como nomes das colunas
 		# index_col=0 é para usar a primeira coluna como index, senão ele vai usar index numérico de 0 em diante
-		df = pd.read_csv('names.txt', names=['name','path'], index_col=0)
-		df['path'] = root + df['path']
-		
-		# temos que fazer essa jogada com ['path'] pois não tem solução de to_dict para apenas 1 coluna.
-		self.ticker = df.to_dict()['path']
+		df = pd.read_csv(names, names=['name','path'], index_col=0)
+		self.ticker = {name: normPath(root, path) for name, path in df['path'].items()}
 		# list(di.keys())[2] # se quisesse indexar um dictionary numericamente
 		self.size = len(self.ticker)
-		self._initFreeFloatFile()
+		self.cache = BarCache(cache_root)
+		self._freeFloat = None # carregado no primeiro uso, ver _initFreeFloatFile
+
+	@classmethod
+	def shared(cls, cache_root='bar_cache', root=None, names='names.txt', freefloat_file='america_2020-11-28.csv'):
+		'''
+		instância compartilhada no processo para essa configuração, criada só na primeira chamada
+		'''
+		if root is None:
+			root = os.environ.get('DATA_ROOT', DATA_ROOT)
+		key = (os.path.abspath(cache_root), os.path.abspath(root), os.path.abspath(names), os.path.abspath(freefloat_file))
+		if key not in cls._shared:
+			cls._shared[key] = cls(cache_root, root, names, freefloat_file)
+		return cls._shared[key]
+
+	def config(self):
+		'''
+		argumentos para recriar (ou pegar com shared) um FileManager igual, por exemplo num processo worker
+		'''
+		return {'cache_root':self.cache.root, 'root':self.root, 'names':self.names, 'freefloat_file':self.freefloat_file}
 
 	def __getitem__(self,i): # é o operador de quando for chamado com []
 		return self.ticker[i]
 
+	def getBars(self, name):
+		'''
+		devolve o Bars do ticker, parseando o csv só se o cache não existir ou estiver desatualizado
+		'''
+		return self.cache.load(name, self.ticker[name])
+
 	def getNames(self):
 		return list(self.ticker.keys())
 
@@ -40,15 +167,18 @@ class FileManager():
 	def show(self):
 		print(self.ticker)
 
+	@property
+	def freeFloat(self):
+		if self._freeFloat is None:
+			self._initFreeFloatFile()
+		return self._freeFloat
+
 	def _initFreeFloatFile(self):
-		filename = 'america_2020-11-28.csv'
-		df = pd.read_csv(filename)
-		df = df[['Ticker', 'Shares Float']] # apenas colunas que interessam, transformaremos essas duas cols em dictionary
+		# o arquivo tem ~200 colunas, mas só lemos as duas que interessam
+		df = pd.read_csv(self.freefloat_file, usecols=['Ticker', 'Shares Float'])
 		df = df.dropna()
 		df = df[ df['Shares Float']>=1 ]
-		df['Shares Float'] = df['Shares Float'].astype('int64') # em teoria essa expressão é errada pois joga coisas numa 
-																# slice que é copia
-		self.freeFloat = dict(zip(df['Ticker'],df['Shares Float']))
+		self._freeFloat = dict(zip(df['Ticker'], df['Shares Float'].astype('int64')))
 
 	def getFreeFloatNames(self):
 		return list( self.freeFloat.keys() )
@@ -0,0 +1,134 @@
+import pandas as pd
+import numpy as np
+import datetime
+import glob
+import os
+import re
+from ColumnStore import ColumnStore
+
+
+def snapshotDate(filename):
+	'''
+	data de um snapshot do screener pelo nome do arquivo (america_2020-11-28.csv -> 2020-11-28)
+	'''
+	m = re.search(r'(\d{4}-\d{2}-\d{2})', os.path.basename(filename))
+	if m is None:
+		raise ValueError(f"não achei a data do snapshot no nome {filename}, passe date=")
+	return datetime.date.fromisoformat(m.group(1))
+
+def readSnapshot(filename):
+	'''
+	lê só Ticker e Shares Float de um snapshot, com os mesmos critérios do FileManager (sem NaN e >= 1)
+	'''
+	df = pd.read_csv(filename, usecols=['Ticker', 'Shares Float'])
+	df = df.dropna()
+	df = df[ df['Shares Float']>=1 ]
+	return np.array(df['Ticker'].astype(str), dtype='U'), df['Shares Float'].to_numpy('float64')
+
+
+class FreeFloatHistory():
+	'''
+	Histórico do free float de cada ticker, montado a partir de vários snapshots datados do screener
+	(america_<data>.csv), para usar o free float que valia em cada dia em vez de um snapshot só.
+	Os snapshots ficam num ColumnStore (um chunk por snapshot, colunas name, date e freefloat) e a busca
+	usa um índice ordenado por (ticker, data): asOf() resolve todos os (ticker, dia) da tabela de
+	ativo-dias com um único searchsorted, então dá pra recalcular a coluna freefloat dentro de um sweep.
+	asOf devolve o último snapshot com data <= dia, ou NaN se não houver (ticker fora dos snapshots ou dia
+	anterior ao primeiro snapshot do ticker); com NaN o fator F fica NaN e o ativo-dia não passa no filtro.
+	------------------------------------------------------------------------------------------
+	Exemplo: ffh = FreeFloatHistory('freefloat.cols')
+			 ffh.ingestDir('screener') # todos os america_*.csv do diretório
+			 adt.setColumn('freefloat', ffh.asOf(adt['name'], adt['date']))
+	------------------------------------------------------------------------------------------
+	'''
+	def __init__(self, path='freefloat.cols'):
+		self.store = ColumnStore(path)
+		self._index = None # chaves ordenadas e colunas na mesma ordem, ver _initIndex
+
+	def __len__(self):
+		return len(self._getIndex()['key'])
+
+	def dates(self):
+		'''
+		datas dos snapshots já ingeridos
+		'''
+		return np.unique(self.store.read(['date'])['date']).astype(datetime.date).tolist()
+
+	def addSnapshot(self, filename, date=None):
+		'''
+		acrescenta um snapshot; date por padrão vem do nome do arquivo (ver snapshotDate)
+		'''
+		date = snapshotDate(filename) if date is None else date
+		names, freefloat = readSnapshot(filename)
+		self.store.append({'name': names,
+							'date': np.full(len(names), np.datetime64(date, 'D')),
+							'freefloat': freefloat})
+		self._index = None
+
+	def ingestDir(self, directory, pattern='america_*.csv'):
+		'''
+		acrescenta todos os snapshots de directory que ainda não estão no histórico; devolve quantos entraram
+		'''
+		have = set(self.dates())
+		n = 0
+		for filename in sorted(glob.glob(os.path.join(directory, pattern))):
+			if snapshotDate(filename) not in have:
+				self.addSnapshot(filename)
+				n += 1
+		return n
+
+	def _getIndex(self):
+		if self._index is None:
+			self._initIndex()
+		return self._index
+
+	def _initIndex(self):
+		if len(self.store) == 0:
+			self._index = {'key': np.zeros(0, dtype='int64'), 'tickers': np.zeros(0, dtype='U'),
+							'tid': np.zeros(0, dtype='int64'), 'day': np.zeros(0, dtype='int64'),
+							'freefloat': np.zeros(0)}
+			return
+		cols = self.store.read()
+		tickers, tid = np.unique(cols['name'], return_inverse=True)
+		day = cols['date'].astype('datetime64[D]').astype('int64')
+		# chave única (ticker, data) em int64: o ticker nos bits altos, a data (dias desde 1970) nos baixos
+		key = (tid.astype('int64') << 32) + day
+		order = np.argsort(key, kind='stable')
+		key = key[order]
+		# o mesmo snapshot ingerido duas vezes: vale o último
+		unique = np.append(key[1:] != key[:-1], True)
+		last = order[unique]
+		self._index = {'key': key[unique], 'tickers': tickers,
+						'tid': tid[last].astype('int64'), 'day': day[last],
+						'freefloat': np.asarray(cols['freefloat'], dtype='float64')[last]}
+
+	def asOf(self, names, dates, max_age=None):
+		'''
+		free float de cada (names[i], dates[i]) no último snapshot até dates[i], vetorizado
+		max_age (em dias) descarta snapshots mais velhos que isso, devolvendo NaN
+		'''
+		idx = self._getIndex()
+		key, tickers = idx['key'], idx['tickers']
+		names = np.asarray(names)
+		day = np.asarray(dates, dtype='datetime64[D]').astype('int64')
+		out = np.full(len(names), np.nan)
+		if len(key) == 0 or len(names) == 0:
+			return out
+
+		tid = np.searchsorted(tickers, names)
+		tid[tid == len(tickers)] = 0
+		known = tickers[tid] == names
+		pos = np.searchsorted(key, (tid.astype('int64') << 32) + day, side='right') - 1
+		ok = known & (pos >= 0)
+		# o snapshot achado tem que ser do mesmo ticker (senão o dia é anterior ao primeiro snapshot dele)
+		ok[ok] = idx['tid'][pos[ok]] == tid[ok]
+		if max_age is not None:
+			ok[ok] = day[ok] - idx['day'][pos[ok]] <= max_age
+		out[ok] = idx['freefloat'][pos[ok]]
+		return out
+
+	def getNames(self):
+		'''
+		tickers que aparecem em algum snapshot
+		'''
+		return self._getIndex()['tickers'].tolist()
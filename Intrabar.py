@@ -0,0 +1,130 @@
+import pandas as pd
+import numpy as np
+import datetime
+import os
+from Bars import toEpochMinute
+
+
+class FineDayLoader():
+	'''
+	Carrega sob demanda os dados mais finos que 1 minuto (barras de segundos ou ticks) de um ticker num dia,
+	só para os dias que precisam deles (trades ambíguos, ver resolveTrades), e guarda o que já foi lido.
+	Os arquivos ficam em root/<ticker>/<YYYY-MM-DD>.csv, no mesmo formato dos csvs de minuto
+	(time,open,high,low,close,volume, com o time em '%Y-%m-%d %H:%M:%S'), em qualquer ordem.
+	Para ticks basta repetir o preço em open, high, low e close.
+	------------------------------------------------------------------------------------------
+	Exemplo: fine = FineDayLoader('fine_data')
+			 fine.load('AAMC', datetime.date(2020,3,2)) # dict de arrays, ou None se não tiver o arquivo
+	------------------------------------------------------------------------------------------
+	'''
+	def __init__(self, root='fine_data'):
+		self.root = root
+		self.days = {} # (name, date) -> dict de arrays ou None
+		self.files_read = 0
+
+	def path(self, name, d):
+		return os.path.join(self.root, name, d.strftime('%Y-%m-%d') + '.csv')
+
+	def load(self, name, d):
+		'''
+		devolve um dict com time (segundos desde 1970-01-01), open, high, low e close em ordem cronológica,
+		ou None se não existir arquivo fino para esse ticker e dia
+		'''
+		key = (name, d)
+		if key not in self.days:
+			path = self.path(name, d)
+			if not os.path.exists(path):
+				self.days[key] = None
+			else:
+				df = pd.read_csv(path, usecols=['time', 'open', 'high', 'low', 'close'])
+				df['time'] = pd.to_datetime(df['time'], format='%Y-%m-%d %H:%M:%S')
+				df = df.sort_values(by='time', kind='stable')
+				self.days[key] = {'time': df['time'].to_numpy().astype('datetime64[s]').astype('int64'),
+									'open': df['open'].to_numpy('float64'),
+									'high': df['high'].to_numpy('float64'),
+									'low': df['low'].to_numpy('float64'),
+									'close': df['close'].to_numpy('float64')}
+				self.files_read += 1
+		return self.days[key]
+
+def isAmbiguous(trade):
+	'''
+	um trade é ambíguo quando as barras de minuto não dizem o que aconteceu primeiro:
+	a barra de saída tocou o stop e o target, ou a barra de entrada (que o motor não olha depois da
+	entrada) tocou o stop ou o target
+	'''
+	entry, exit = trade['entry'], trade['exit']
+	exit_both = exit['high'] >= trade['stop'] and exit['low'] <= trade['target']
+	entry_any = entry['high'] >= trade['stop'] or entry['low'] <= trade['target']
+	return exit_both or entry_any
+
+def _barWindow(bar_time, label):
+	# intervalo [início, fim) em segundos coberto pela barra de minuto com esse time
+	t = toEpochMinute(bar_time)*60
+	return (t - 60, t) if label == 'end' else (t, t + 60)
+
+def resolveTrade(trade, fine, exit_target, exit_stop, label='end'):
+	'''
+	Refaz a saída de um trade com os dados finos do dia. A entrada passa a ser o primeiro dado fino da
+	barra de entrada que atinge o preço de entrada, e a saída o primeiro dado fino depois disso que toca
+	o stop ou o target (se um mesmo dado fino tocar os dois, continua contando como stop).
+	label diz se o time das barras de minuto é o fim ('end', barra das 9:31 cobre 9:30:00 a 9:30:59)
+	ou o início ('start') do minuto.
+	Devolve o trade novo, ou None se os dados finos não resolverem o trade (nenhum toque até o fim da
+	barra de saída, ou dados que não batem com as barras de minuto); nesse caso vale o trade original.
+	'''
+	e0, e1 = _barWindow(trade['entry']['time'], label)
+	x0, x1 = _barWindow(trade['exit']['time'], label)
+	t = fine['time']
+	window = np.flatnonzero((t >= e0) & (t < x1))
+	if len(window) == 0:
+		return None
+
+	in_entry = t[window] < e1
+	reached = in_entry & (fine['high'][window] >= trade['price'])
+	if not reached.any():
+		return None
+	e = int(reached.argmax())
+
+	after = window[e+1:]
+	stop = fine['high'][after] >= trade['stop']
+	target = fine['low'][after] <= trade['target']
+	hit = stop | target
+	if not hit.any():
+		return None
+	k = int(hit.argmax())
+
+	new = dict(trade)
+	new['exit'] = trade['entry'] if t[after[k]] < e1 else trade['exit'] # barra de minuto onde está a saída
+	new['exit_time_fine'] = datetime.datetime(1970,1,1) + datetime.timedelta(seconds=int(t[after[k]]))
+	new['profit'] = -exit_stop if stop[k] else exit_target
+	return new
+
+def resolveTrades(trades, loader, exit_target, exit_stop, label='end'):
+	'''
+	aplica resolveTrade nos trades ambíguos de uma lista no formato de TradesAnalyser.trades, carregando
+	dados finos só para esses dias; devolve (trades, report), com report contando os trades ambíguos,
+	os que foram resolvidos, os que não tinham dados finos e os que mudaram de resultado
+	'''
+	report = {'ambiguous':0, 'resolved':0, 'missing':0, 'changed':0}
+	out = []
+	for t in trades:
+		trade = t['trade']
+		if trade is None or not isAmbiguous(trade):
+			out.append(t)
+			continue
+		report['ambiguous'] += 1
+		fine = loader.load(t['name'], t['date'])
+		if fine is None:
+			report['missing'] += 1
+			out.append(t)
+			continue
+		new = resolveTrade(trade, fine, exit_target, exit_stop, label)
+		if new is None:
+			out.append(t)
+			continue
+		report['resolved'] += 1
+		if new['profit'] != trade['profit'] or new['exit'] is not trade['exit']:
+			report['changed'] += 1
+		out.append({'name':t['name'], 'date':t['date'], 'trade':new})
+	return out, report
@@ -0,0 +1,104 @@
+import numpy as np
+from multiprocessing import shared_memory
+
+# colunas do ativo-dia que os workers precisam para filtrar e simular
+# as barras em si não passam por aqui, os workers abrem direto o cache mmap do FileManager
+AD_STATS = ['volPre', 'openValue', 'gap']
+
+
+class SharedColumns():
+	'''
+	Um dict de arrays numpy colocado em shared memory, para ser lido por vários processos sem cópia
+	e sem pickle dos dados. Quem cria (create) é dono dos blocos e deve chamar close() no final;
+	os workers usam attach(spec), onde spec é um dict pequeno e picklable com nome, dtype e shape.
+	------------------------------------------------------------------------------------------
+	Exemplo: sc = SharedColumns.create({'a': np.arange(10)})
+			 cols = SharedColumns.attach(sc.spec).columns # em outro processo
+	------------------------------------------------------------------------------------------
+	'''
+	def __init__(self, blocks, spec, columns):
+		self.blocks = blocks
+		self.spec = spec
+		self.columns = columns
+
+	@classmethod
+	def create(cls, columns):
+		blocks, spec, views = [], {}, {}
+		for name, arr in columns.items():
+			arr = np.ascontiguousarray(arr)
+			shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+			view = np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)
+			view[...] = arr
+			blocks.append(shm)
+			spec[name] = (shm.name, arr.dtype.str, arr.shape)
+			views[name] = view
+		return cls(blocks, spec, views)
+
+	@classmethod
+	def attach(cls, spec):
+		blocks, views = [], {}
+		for name, (shm_name, dtype, shape) in spec.items():
+			shm = shared_memory.SharedMemory(name=shm_name)
+			blocks.append(shm)
+			views[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+		return cls(blocks, spec, views)
+
+	def close(self, unlink=False):
+		self.columns = {}
+		for shm in self.blocks:
+			shm.close()
+			if unlink:
+				shm.unlink()
+		self.blocks = []
+
+def tableColumns(adt):
+	'''
+	colunas da AtivoDiaTable que a filtragem e a simulação usam
+	'''
+	return {c: adt[c] for c in ['name', 'date', 'freefloat'] + AD_STATS}
+
+
+# estado de cada processo worker, inicializado uma vez por processo em _initWorker
+_worker = {}
+
+def _initWorker(spec, fm_config, intrabar=None):
+	import TradesAnalyser as ta # import aqui dentro pra evitar import circular
+	from AtivoDia import AtivoDiaTable
+	from FileManager import FileManager
+	shared = SharedColumns.attach(spec) # fica aberto enquanto o worker viver, a tabela usa os blocos direto
+	_worker['shared'] = shared
+	_worker['analyser'] = ta.TradesAnalyser(AtivoDiaTable(shared.columns), fm=FileManager.shared(**fm_config))
+	if intrabar is not None: # (fine_root, label) de setIntrabarResolution
+		_worker['analyser'].setIntrabarResolution(*intrabar)
+
+def _runCombo(task):
+	'''
+	roda uma combinação de parâmetros no worker e devolve (índice, linha de resultado, tempos por estágio)
+	'''
+	from Profiler import TIMER
+	index, pars, seed = task
+	TIMER.reset() # os tempos de cada combinação voltam junto com o resultado
+	an = _worker['analyser']
+	an._setPars(pars)
+	an.runFiltering()
+	an.runSimulation()
+	row = an.getSimResults(seed=seed) # seed por combinação, pro bootstrap não depender do worker
+	return index, row, TIMER.stages
+
+def _tickerAtivoDias(task):
+	'''
+	calcula os ativo-dias de um ticker num worker e devolve as colunas (formato de AtivoDiaTable)
+	só o resultado, que é pequeno, volta pro processo principal; as barras ficam no worker
+	'''
+	import Ativo as at # import aqui dentro pra evitar import circular
+	from FileManager import BarCache
+	name, path, freefloat, cache_root = task
+	bars = BarCache(cache_root).load(name, path) if cache_root is not None else None
+	a = at.Ativo(name, path, bars)
+	days = a._bounds['day']
+	# as stats já saem do kernel em colunas, no mesmo formato da AtivoDiaTable
+	cols = {'name': np.full(len(days), name),
+			'date': days.astype('datetime64[D]'),
+			'freefloat': np.full(len(days), freefloat, dtype='float64')}
+	cols.update(a.statColumns())
+	return cols
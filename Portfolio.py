@@ -0,0 +1,104 @@
+import pandas as pd
+import numpy as np
+import heapq
+from Bars import toEpochMinute
+from Utilities import drawdown
+
+
+class Portfolio():
+	'''
+	Simulador de carteira orientado a eventos, com resolução de minuto.
+	Ao contrário de getTrades, que compõe os trades um atrás do outro em ordem de data, aqui as entradas
+	e saídas de todos os ativo-dias entram numa fila de prioridade (heapq) ordenada pelo minuto, então
+	trades do mesmo dia (ou do mesmo minuto) disputam o mesmo caixa:
+		- cada entrada usa allocation da equity do momento, limitado ao caixa disponível
+		- no máximo max_positions posições abertas ao mesmo tempo, as entradas além disso são puladas
+		- locate_fee (sobre o valor da posição) e commission (por trade) são cobrados na saída, como em getTrades
+	A equity é caixa mais o valor de entrada das posições abertas (sem marcação a mercado no meio do trade).
+	No mesmo minuto as saídas são processadas antes das entradas, liberando caixa e vagas.
+	------------------------------------------------------------------------------------------
+	Exemplo: pf = Portfolio(start_money=10000, allocation=0.1, max_positions=5).run(an.trades)
+			 pf.ledger, pf.equity
+	------------------------------------------------------------------------------------------
+	'''
+	ENTRY = 1 # no mesmo minuto, saídas (0) antes de entradas (1)
+	EXIT = 0
+
+	def __init__(self, start_money=10000, allocation=0.1, locate_fee=0.02, commission=2, max_positions=10):
+		self.start_money = start_money
+		self.allocation = allocation
+		self.locate_fee = locate_fee
+		self.commission = commission
+		self.max_positions = max_positions
+
+		self.ledger = pd.DataFrame() # um trade por linha, com taken, size, pnl e a equity depois da saída
+		self.equity = pd.DataFrame() # curva de equity, uma linha por saída
+		self.skipped = 0 # entradas puladas por falta de caixa ou de vagas
+
+	def run(self, trades):
+		'''
+		trades: lista no formato de TradesAnalyser.trades (dicts com name, date e trade, None se não teve trade)
+		'''
+		tt = [t for t in trades if t['trade']]
+		n = len(tt)
+		entry = np.array([toEpochMinute(t['trade']['entry']['time']) for t in tt], dtype='int64')
+		exit = np.array([toEpochMinute(t['trade']['exit']['time']) for t in tt], dtype='int64')
+		profit = np.array([t['trade']['profit'] for t in tt], dtype='float64')
+
+		size = np.zeros(n)
+		pnl = np.zeros(n)
+		equity_after = np.full(n, np.nan)
+		taken = np.zeros(n, dtype='bool')
+		curve_time, curve_equity, curve_open = [], [], []
+
+		# a fila começa só com as entradas; a saída de cada trade aceito é empurrada na hora da entrada
+		events = [(int(entry[i]), self.ENTRY, i) for i in range(n)]
+		heapq.heapify(events)
+		cash, invested, n_open = float(self.start_money), 0.0, 0
+		while events:
+			t, kind, i = heapq.heappop(events)
+			if kind == self.ENTRY:
+				if self.max_positions is not None and n_open >= self.max_positions:
+					continue
+				s = min(self.allocation*(cash + invested), cash)
+				if s <= 0:
+					continue
+				cash -= s
+				invested += s
+				n_open += 1
+				size[i] = s
+				taken[i] = True
+				heapq.heappush(events, (int(exit[i]), self.EXIT, i))
+			else:
+				s = size[i]
+				pnl[i] = s*profit[i] - s*self.locate_fee - self.commission
+				cash += s + pnl[i]
+				invested -= s
+				n_open -= 1
+				equity_after[i] = cash + invested
+				curve_time.append(t)
+				curve_equity.append(cash + invested)
+				curve_open.append(n_open)
+
+		self.skipped = int(n - taken.sum())
+		self.ledger = pd.DataFrame({'name':[t['name'] for t in tt],
+									'date':pd.to_datetime([t['date'] for t in tt]),
+									'entry_time':entry.astype('datetime64[m]'),
+									'exit_time':exit.astype('datetime64[m]'),
+									'profit':profit,
+									'taken':taken,
+									'size':size,
+									'pnl':pnl,
+									'equity':equity_after})
+		self.equity = pd.DataFrame({'time':np.array(curve_time, dtype='int64').astype('datetime64[m]'),
+									'equity':np.array(curve_equity, dtype='float64'),
+									'open_positions':np.array(curve_open, dtype='int64')})
+		return self
+
+	def getEndMoney(self):
+		if len(self.equity) == 0:
+			return self.start_money
+		return self.equity['equity'].iloc[-1]
+
+	def getMaxDrawdown(self):
+		return drawdown(self.equity['equity']/self.start_money)
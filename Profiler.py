@@ -0,0 +1,171 @@
+import pandas as pd
+import functools
+import datetime
+import json
+import time
+import cProfile
+import pstats
+import io
+import tracemalloc
+from contextlib import contextmanager
+
+
+class StageTimer():
+	'''
+	Acumula, por estágio do pipeline (csv_parse, day_lookup, check_for_trade, get_trades, drawdown,
+	bootstrap, ...), o número de chamadas, o tempo total e um contador de itens (linhas, dias, trades).
+	Existe uma instância global, TIMER, usada pelos decorators @timed espalhados pelo código; report()
+	devolve o resumo como DataFrame e toJson() como json, pra comparar execuções.
+	Os estágios podem ser aninhados (runBootstrap chama getTrades, por exemplo): total_s é o tempo
+	exclusivo do estágio, sem o dos estágios chamados dentro dele, então total_s e share somam o tempo
+	medido uma vez só; inclusive_s é o tempo com os estágios internos.
+	------------------------------------------------------------------------------------------
+	Exemplo: TIMER.reset()
+			 an.runSimulationGroup(...)
+			 TIMER.report()
+	------------------------------------------------------------------------------------------
+	'''
+	def __init__(self):
+		self.enabled = True
+		self.reset()
+
+	def reset(self):
+		self.stages = {} # estágio -> [chamadas, segundos exclusivos, itens, segundos inclusivos]
+		self._stack = [] # tempo dos estágios filhos de cada estágio aberto
+
+	def add(self, stage, seconds, items=0, exclusive=None):
+		s = self.stages.setdefault(stage, [0, 0.0, 0, 0.0])
+		s[0] += 1
+		s[1] += seconds if exclusive is None else exclusive
+		s[2] += items
+		s[3] += seconds
+
+	def _enter(self):
+		self._stack.append(0.0)
+
+	def _exit(self, stage, seconds, items=0):
+		children = self._stack.pop() if self._stack else 0.0 # um reset() no meio de um estágio esvazia a pilha
+		if self._stack:
+			self._stack[-1] += seconds
+		self.add(stage, seconds, items, seconds - children)
+
+	def merge(self, stages):
+		'''
+		soma os estágios de outro StageTimer (por exemplo o de um processo worker, via .stages)
+		'''
+		for stage, (calls, seconds, items, inclusive) in stages.items():
+			s = self.stages.setdefault(stage, [0, 0.0, 0, 0.0])
+			s[0] += calls
+			s[1] += seconds
+			s[2] += items
+			s[3] += inclusive
+
+	@contextmanager
+	def stage(self, stage, items=0):
+		if not self.enabled:
+			yield
+			return
+		self._enter()
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			self._exit(stage, time.perf_counter() - start, items)
+
+	def report(self):
+		df = pd.DataFrame([{'stage':k, 'calls':v[0], 'total_s':v[1], 'inclusive_s':v[3], 'items':v[2]}
+							for k, v in self.stages.items()],
+						columns=['stage', 'calls', 'total_s', 'inclusive_s', 'items'])
+		df['mean_s'] = df['total_s']/df['calls']
+		df['share'] = df['total_s']/df['total_s'].sum() if len(df) else df['total_s']
+		return df.sort_values(by='total_s', ascending=False, ignore_index=True)
+
+	def toJson(self, filename=None, **meta):
+		'''
+		relatório em json (com meta, por exemplo parâmetros ou commit, e a hora); grava em filename se for passado
+		'''
+		data = dict(meta, time=datetime.datetime.now().isoformat(timespec='seconds'),
+					stages=self.report().to_dict(orient='records'))
+		s = json.dumps(data, indent=1)
+		if filename is not None:
+			with open(filename, 'w') as file:
+				file.write(s)
+		return s
+
+TIMER = StageTimer()
+
+def timed(stage, count=None):
+	'''
+	decorator que soma o tempo da função no estágio stage de TIMER
+	count(resultado) devolve o número de itens processados na chamada (linhas, dias, trades)
+	'''
+	def decorator(f):
+		@functools.wraps(f)
+		def wrapper(*args, **kwargs):
+			if not TIMER.enabled:
+				return f(*args, **kwargs)
+			TIMER._enter()
+			start = time.perf_counter()
+			try:
+				res = f(*args, **kwargs)
+			except BaseException:
+				TIMER._exit(stage, time.perf_counter() - start)
+				raise
+			TIMER._exit(stage, time.perf_counter() - start, count(res) if count else 0)
+			return res
+		return wrapper
+	return decorator
+
+
+class Profile():
+	'''
+	Profiling opcional de um trecho de código com cProfile (tempo por função) e tracemalloc (memória).
+	------------------------------------------------------------------------------------------
+	Exemplo: with Profile(memory=True) as prof:
+				 an.runSimulationGroup(...)
+			 prof.top(20)
+			 prof.peak_mb
+	------------------------------------------------------------------------------------------
+	'''
+	def __init__(self, cpu=True, memory=False):
+		self.cpu = cpu
+		self.memory = memory
+		self.profiler = None
+		self.stats = None # pstats.Stats depois do with
+		self.peak_mb = None # pico de memória alocada pelo python dentro do with, em MB
+		self.snapshot = None # tracemalloc.Snapshot no fim do with
+
+	def __enter__(self):
+		if self.memory:
+			tracemalloc.start()
+		if self.cpu:
+			self.profiler = cProfile.Profile()
+			self.profiler.enable()
+		return self
+
+	def __exit__(self, *exc):
+		if self.cpu:
+			self.profiler.disable()
+			self.stats = pstats.Stats(self.profiler, stream=io.StringIO())
+		if self.memory:
+			self.snapshot = tracemalloc.take_snapshot()
+			self.peak_mb = tracemalloc.get_traced_memory()[1]/1e6
+			tracemalloc.stop()
+		return False
+
+	def top(self, n=20, sort='cumulative'):
+		'''
+		as n funções com mais tempo, como DataFrame
+		'''
+		rows = []
+		for (file, line, func), (cc, nc, tt, ct, callers) in self.stats.stats.items():
+			rows.append({'function':f"{file}:{line}({func})", 'calls':nc, 'tottime':tt, 'cumtime':ct})
+		by = {'cumulative':'cumtime', 'tottime':'tottime', 'calls':'calls'}[sort]
+		return pd.DataFrame(rows).sort_values(by=by, ascending=False, ignore_index=True).head(n)
+
+	def topMemory(self, n=20):
+		'''
+		as n linhas de código com mais memória alocada ainda viva no fim do with, como DataFrame
+		'''
+		stats = self.snapshot.statistics('lineno')[:n]
+		return pd.DataFrame([{'line':str(s.traceback), 'size_mb':s.size/1e6, 'count':s.count} for s in stats])
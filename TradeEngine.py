@@ -0,0 +1,278 @@
+import numpy as np
+import datetime
+from Bars import fromEpochMinute, toEpochMinute
+from Profiler import timed
+
+# colunas do formato colunar de trades (tradesToColumns), uma linha por ativo-dia simulado
+# entry_* e exit_* são as barras de entrada e saída, com o time em minutos desde EPOCH
+BAR_FIELDS = ['time', 'open', 'high', 'low', 'close', 'volume']
+TRADE_COLUMNS = (['name', 'date', 'has_trade'] + ['entry_' + f for f in BAR_FIELDS] +
+				['exit_' + f for f in BAR_FIELDS] + ['price', 'stop', 'target', 'profit'])
+
+
+class CoreBatch():
+	'''
+	Barras do core (9:31 até 16:00) de vários dias concatenadas em arrays únicos (ragged arrays).
+	O dia k ocupa as posições offsets[k]:offsets[k+1] de cada coluna.
+	É a entrada do motor de trades em lote (checkForTrades), que processa todos os dias de uma vez.
+	------------------------------------------------------------------------------------------
+	Exemplo: batch = CoreBatch(loader.load(fad))
+			 res = checkForTrades(batch, 0.1, 0.3, 0.3)
+	------------------------------------------------------------------------------------------
+	'''
+	def __init__(self, intras):
+		cores = [intra._core for intra in intras]
+		lens = np.array([len(c) for c in cores], dtype='int64')
+		self.offsets = np.concatenate(([0], np.cumsum(lens))).astype('int64')
+		self.n_days = len(cores)
+		for c in ('time', 'open', 'high', 'low', 'close', 'volume'):
+			cols = [getattr(core, c) for core in cores]
+			setattr(self, c, np.concatenate(cols) if cols else np.zeros(0))
+
+	def lengths(self):
+		return np.diff(self.offsets)
+
+	def bar(self, i):
+		'''
+		barra i (posição global) no formato de dict antigo, igual a Bars.bar
+		'''
+		return {'time': fromEpochMinute(self.time[i]),
+				'open': float(self.open[i]),
+				'high': float(self.high[i]),
+				'low': float(self.low[i]),
+				'close': float(self.close[i]),
+				'volume': int(self.volume[i])}
+
+def firstTrue(mask, starts, ends):
+	'''
+	para cada segmento starts[k]:ends[k] de mask, devolve a posição global do primeiro True,
+	ou ends[k] se o segmento não tiver nenhum True (ou for vazio)
+	'''
+	n = len(mask)
+	idx = np.where(mask, np.arange(n), n)
+	res = ends.copy()
+	nonempty = ends > starts
+	if nonempty.any():
+		# reduceat não lida com segmentos vazios, então só passamos os não vazios
+		first = np.minimum.reduceat(idx, starts[nonempty])
+		res[nonempty] = np.minimum(first, ends[nonempty])
+	return res
+
+@timed('check_for_trade', count=lambda res: len(res['profit']))
+def checkForTrades(batch, short_after, exit_target, exit_stop):
+	'''
+	Versão vetorizada de IntraDay.checkForTrade para todos os dias de um CoreBatch de uma vez.
+	A semântica é exatamente a mesma (short, entrada na primeira barra que não é a última cuja high
+	atinge short_after acima do open, stop testado antes do target, fechamento no close da última barra)
+	e os valores são bit a bit iguais aos da versão por dia.
+	Devolve um dict de arrays com uma posição por dia:
+		has_trade, entry, exit (posições globais das barras no batch), price, stop, target, profit
+	'''
+	starts = batch.offsets[:-1]
+	ends = batch.offsets[1:]
+	lens = ends - starts
+	n = len(batch.high)
+	day = np.repeat(np.arange(batch.n_days), lens) # dia de cada barra
+	pos = np.arange(n)
+
+	first_open = np.zeros(batch.n_days)
+	first_open[lens > 0] = batch.open[starts[lens > 0]]
+
+	# ENTRY POINT: primeira barra, exceto a última do dia, com variação >= short_after
+	fo = first_open[day]
+	variation = (batch.high - fo)/fo
+	not_last = pos != (ends - 1)[day]
+	entry = firstTrue((variation >= short_after) & not_last, starts, ends)
+	has_trade = entry < ends
+
+	price = (1+short_after)*first_open
+	stop = (1+exit_stop)*price
+	target = (1-exit_target)*price # lembrar que pra short o target é menor
+
+	# EXIT POINTS: primeira barra depois da entrada que toca o stop ou o target
+	after = has_trade[day] & (pos > entry[day])
+	hit = after & ((batch.high >= stop[day]) | (batch.low <= target[day]))
+	exits = firstTrue(hit, starts, ends)
+	hit_any = exits < ends
+	exits[~hit_any] = ends[~hit_any] - 1 # sem stop nem target, fecha na última barra
+
+	profit = np.zeros(batch.n_days)
+	x = exits[has_trade & hit_any]
+	# o stop tem prioridade: se a barra tocou os dois, conta como stop
+	profit[has_trade & hit_any] = np.where(batch.high[x] >= stop[has_trade & hit_any], -exit_stop, exit_target)
+	close_out = has_trade & ~hit_any
+	last_close = batch.close[exits[close_out]]
+	profit[close_out] = -(last_close - price[close_out])/price[close_out]
+
+	return {'has_trade':has_trade, 'entry':entry, 'exit':exits,
+			'price':price, 'stop':stop, 'target':target, 'profit':profit}
+
+def padded(batch, col, fill):
+	'''
+	coluna col do batch como array 2D (dias x maior dia), completando os dias menores com fill
+	'''
+	lens = batch.lengths()
+	width = max(int(lens.max()), 1) if len(lens) else 1
+	out = np.full((batch.n_days, width), fill, dtype='float64')
+	mask = np.arange(width) < lens[:,None]
+	out[mask] = getattr(batch, col)
+	return out
+
+@timed('sweep_trades', count=lambda res: res['profit'].size)
+def sweepTrades(batch, short_after, exit_target, exit_stop, chunk=2048):
+	'''
+	Avalia todas as combinações de (short_after, exit_target, exit_stop) em todos os dias do batch numa
+	passada só, em vez de rodar checkForTrades uma vez por combinação.
+	Para cada dia usamos o máximo acumulado da variação da high desde o open: a entrada para um
+	short_after s é a primeira barra em que esse máximo passa de s. Depois, para cada nível de stop e de
+	target, achamos a primeira barra depois da entrada que toca o nível; o exit é o que vier primeiro,
+	com o stop ganhando em caso de empate, exatamente como em checkForTrade.
+	Os resultados são bit a bit iguais a checkForTrades para cada combinação.
+	Devolve um dict de arrays com shape (len(short_after), len(exit_target), len(exit_stop), n_days)
+	com as mesmas chaves de checkForTrades. Os dias são processados em blocos de chunk dias.
+	'''
+	sa = np.asarray(short_after, dtype='float64')
+	et = np.asarray(exit_target, dtype='float64')
+	es = np.asarray(exit_stop, dtype='float64')
+	shape = (len(sa), len(et), len(es), batch.n_days)
+	res = {'has_trade':np.zeros(shape, dtype='bool'), 'entry':np.zeros(shape, dtype='int64'),
+			'exit':np.zeros(shape, dtype='int64'), 'price':np.zeros(shape), 'stop':np.zeros(shape),
+			'target':np.zeros(shape), 'profit':np.zeros(shape)}
+
+	for c0 in range(0, batch.n_days, chunk):
+		c1 = min(c0 + chunk, batch.n_days)
+		sub = _subBatch(batch, c0, c1)
+		lens = sub.lengths()
+		starts = batch.offsets[c0:c1]
+		high = padded(sub, 'high', -np.inf) # padding que nunca toca stop
+		low = padded(sub, 'low', np.inf) # nem target
+		close = padded(sub, 'close', np.nan)
+		cols = np.arange(high.shape[1])
+		days = np.arange(c1 - c0)
+
+		first_open = np.zeros(c1 - c0)
+		first_open[lens > 0] = sub.open[sub.offsets[:-1][lens > 0]]
+		with np.errstate(divide='ignore', invalid='ignore'): # dias sem core ficam com first_open 0
+			variation = (high - first_open[:,None])/first_open[:,None]
+		variation[cols >= (lens - 1)[:,None]] = -np.inf # a última barra do dia nunca é entrada
+		runmax = np.maximum.accumulate(variation, axis=1) # máximo da variação desde o open
+
+		for i, s in enumerate(sa):
+			# a primeira barra com runmax >= s é a primeira com variação >= s, ou seja, a entrada
+			crossed = runmax >= s
+			has_trade = crossed.any(axis=1)
+			entry = crossed.argmax(axis=1)
+			after = cols > entry[:,None]
+			price = (1+s)*first_open
+
+			first_stop = {}
+			for k, st in enumerate(es):
+				stop = (1+st)*price
+				m = after & (high >= stop[:,None])
+				first_stop[k] = np.where(m.any(axis=1), m.argmax(axis=1), high.shape[1])
+			for j, t in enumerate(et):
+				target = (1-t)*price
+				m = after & (low <= target[:,None])
+				first_target = np.where(m.any(axis=1), m.argmax(axis=1), high.shape[1])
+				for k, st in enumerate(es):
+					stop = (1+st)*price
+					x = np.minimum(first_stop[k], first_target)
+					hit_any = x < lens
+					x = np.where(hit_any, x, lens - 1)
+					last_close = close[days, np.maximum(x, 0)]
+					profit = np.where(first_stop[k] <= first_target, -st, t)
+					profit = np.where(hit_any, profit, -(last_close - price)/price)
+
+					res['has_trade'][i,j,k,c0:c1] = has_trade
+					# sem trade, entry e exit ficam como em checkForTrades (fim do dia e última barra)
+					res['entry'][i,j,k,c0:c1] = np.where(has_trade, starts + entry, starts + lens)
+					res['exit'][i,j,k,c0:c1] = np.where(has_trade, starts + x, starts + lens - 1)
+					res['price'][i,j,k,c0:c1] = price
+					res['stop'][i,j,k,c0:c1] = stop
+					res['target'][i,j,k,c0:c1] = target
+					res['profit'][i,j,k,c0:c1] = np.where(has_trade, profit, 0)
+	return res
+
+def _subBatch(batch, c0, c1):
+	'''
+	view dos dias c0:c1 de um CoreBatch
+	'''
+	sub = CoreBatch([])
+	a, b = batch.offsets[c0], batch.offsets[c1]
+	sub.offsets = batch.offsets[c0:c1+1] - a
+	sub.n_days = c1 - c0
+	for c in ('time', 'open', 'high', 'low', 'close', 'volume'):
+		setattr(sub, c, getattr(batch, c)[a:b])
+	return sub
+
+def selectCombo(res, i, j, k):
+	'''
+	extrai de um resultado de sweepTrades a combinação (i, j, k), no mesmo formato de checkForTrades
+	'''
+	return {key: v[i,j,k] for key, v in res.items()}
+
+def toTradeDicts(batch, res, days=None):
+	'''
+	converte o resultado de checkForTrades na lista de trades do formato antigo
+	(o mesmo dict que IntraDay.checkForTrade devolve, ou None se não teve trade no dia)
+	days permite converter só alguns dias do batch, na ordem dada
+	'''
+	trades = []
+	for k in (range(batch.n_days) if days is None else days):
+		if not res['has_trade'][k]:
+			trades.append(None)
+			continue
+		trades.append({'entry': batch.bar(res['entry'][k]),
+						'price': float(res['price'][k]),
+						'stop': float(res['stop'][k]),
+						'target': float(res['target'][k]),
+						'exit': batch.bar(res['exit'][k]),
+						'profit': float(res['profit'][k])})
+	return trades
+
+def tradesToColumns(trades):
+	'''
+	converte self.trades do TradesAnalyser (lista de dicts com name, date e trade) em colunas TRADE_COLUMNS
+	os dias sem trade ficam com has_trade False e zeros nas outras colunas
+	'''
+	n = len(trades)
+	cols = {'name': np.array([t['name'] for t in trades], dtype='U'),
+			'date': np.array([t['date'] for t in trades], dtype='datetime64[D]'),
+			'has_trade': np.array([t['trade'] is not None for t in trades], dtype='bool')}
+	for c in TRADE_COLUMNS[3:]:
+		cols[c] = np.zeros(n, dtype='int64' if c.endswith(('_time', '_volume')) else 'float64')
+	for i, t in enumerate(trades):
+		trade = t['trade']
+		if trade is None:
+			continue
+		for side in ('entry', 'exit'):
+			bar = trade[side]
+			cols[side + '_time'][i] = toEpochMinute(bar['time'])
+			for f in BAR_FIELDS[1:]:
+				cols[side + '_' + f][i] = bar[f]
+		for f in ('price', 'stop', 'target', 'profit'):
+			cols[f][i] = trade[f]
+	return cols
+
+def columnsToTrades(cols):
+	'''
+	operação inversa de tradesToColumns, devolve a lista de trades no formato de self.trades
+	'''
+	dates = cols['date'].astype(datetime.date)
+	trades = []
+	for i in range(len(cols['name'])):
+		trade = None
+		if cols['has_trade'][i]:
+			trade = {}
+			for side in ('entry', 'exit'):
+				trade[side] = {'time': fromEpochMinute(cols[side + '_time'][i]),
+								'open': float(cols[side + '_open'][i]),
+								'high': float(cols[side + '_high'][i]),
+								'low': float(cols[side + '_low'][i]),
+								'close': float(cols[side + '_close'][i]),
+								'volume': int(cols[side + '_volume'][i])}
+			for f in ('price', 'stop', 'target', 'profit'):
+				trade[f] = float(cols[f][i])
+			trade = {k: trade[k] for k in ('entry', 'price', 'stop', 'target', 'exit', 'profit')} # ordem do checkForTrade
+		trades.append({'name': str(cols['name'][i]), 'date': dates[i], 'trade': trade})
+	return trades
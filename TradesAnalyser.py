@@ -3,18 +3,71 @@ import pandas as pd
 import numpy as np
 import datetime
 import Ativo as at
+import TradeEngine as te
 import pickle
-from Utilities import drawdown
+import Parallel as par
+from AtivoDia import AtivoDiaTable, timeToMinute
+from ColumnStore import ColumnStore
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from Bars import MINUTES_PER_DAY
+from Portfolio import Portfolio
+from Intrabar import FineDayLoader, resolveTrades
+from Profiler import TIMER, timed
+from Utilities import drawdown, maxDrawdowns, equityCurve, rollingWindows, GroupCheckpoint
 from matplotlib import pyplot as plt
 
+MARKET_OPEN = 9*60+31 # primeira barra do core (9:31) em minutos do dia, referência de minsToSpike e mins_to_trade
+HHMM = np.array([f"{m//60:02d}:{m%60:02d}" for m in range(MINUTES_PER_DAY)], dtype=object) # minuto do dia -> 'HH:MM'
+
+def isPickle(filename):
+	'''
+	arquivos .pkl/.pickle são do formato antigo (pickle), qualquer outro nome é um ColumnStore
+	'''
+	return filename.endswith(('.pkl', '.pickle'))
+
+def convertPickle(src, dst):
+	'''
+	importa um pickle antigo de saveTrades (lista de trades) ou de saveGroupResults (DataFrame)
+	para o formato colunar em dst, acrescentando no final se dst já tiver dados
+	'''
+	with open(src, 'rb') as filehandle:
+		loaded = pickle.load(filehandle)
+	if isinstance(loaded, pd.DataFrame):
+		ColumnStore(dst).append({c: loaded[c].to_numpy() for c in loaded.columns})
+	else:
+		ColumnStore(dst).append(te.tradesToColumns(loaded))
+
+def printProgress(done, total, start):
+	'''
+	progresso padrão das simulações em grupo: combinações feitas, tempo decorrido e estimativa do que falta
+	'''
+	elapsed = datetime.datetime.now() - start
+	eta = elapsed/done*(total - done)
+	print(f"{done}/{total} combinações | decorrido {str(elapsed).split('.')[0]} | faltam ~{str(eta).split('.')[0]}")
+
+
 class TradesAnalyser():
 	'''
 	Calcula os Trades e analisa eles
 	'''
-	def __init__(self, adl):
-		self.fm = fman.FileManager()
-		self.adl = adl # ADL: Ativos-Dias List
+	# atributos que definem o resultado de getTrades: mudar qualquer um deles invalida o ledger em cache
+	LEDGER_INPUTS = ('trades', 'start_money', 'allocation', 'locate_fee', 'commission')
+
+	def __init__(self, adl, cache_root='bar_cache', fm=None):
+		self._ledger = None # DataFrame de trades já calculado para o estado atual (ver getTrades)
+		# por padrão usa o FileManager compartilhado do processo, então vários analysers não releem names.txt
+		self.fm = fm if fm is not None else fman.FileManager.shared(cache_root)
+		self.loader = at.DayLoader(self.fm) # carrega os ativo-dias agrupados por ticker e guarda os já lidos
+		self.io_stats = {'files':0, 'bytes':0} # arquivos e bytes lidos na última simulação
+		# adl pode ser a lista de ativo-dias ou uma AtivoDiaTable; a filtragem sempre usa a tabela (adt)
+		if isinstance(adl, AtivoDiaTable):
+			self.adt = adl
+			self.adl = None
+		else:
+			self.adl = adl # ADL: Ativos-Dias List
+			self.adt = AtivoDiaTable.fromList(adl) # ADT: Ativos-Dias Table
 		self.fad = [] # FAD: Filtered Ativos-Dias
+		self.fad_idx = np.zeros(0, dtype='int64')
 		self.trades = [] # trade results from last simulation
 		self.n_trades = 0 # number of non-None trades
 
@@ -34,9 +87,17 @@ class TradesAnalyser():
 		self.commission = 2
 
 		self.results = pd.DataFrame()
+		self.portfolio = None # último resultado de runPortfolio
+		self.timings = pd.DataFrame() # tempo por estágio (Profiler.TIMER) do último grupo de simulações
+		self.wf_results = pd.DataFrame() # uma linha por janela do último runWalkForward
+		self.wf_equity = pd.DataFrame() # trades fora da amostra de todas as janelas, com a equity emendada
+		self.fine_loader = None # FineDayLoader, se a resolução intrabar estiver ligada (setIntrabarResolution)
+		self.fine_label = 'end'
+		self.intrabar_report = {} # contagens da última resolução intrabar
 
 		self.bs_base = pd.DataFrame() # caso base do bootstrap
-		self.bsl = [] # Boot Strap List: uma lista com varios dataframes. Cada df, uma combinação de trades.
+		self.bs_profit = np.zeros((0,0)) # matriz (n_iter x n_trades) com os profit_real reamostrados
+		self.bs_cum = np.zeros((0,0)) # cum_profit_real de cada linha de bs_profit
 
 	def setFilterParameters(self,prevol_threshold=800000,open_dolar_threshold=2,gap_threshold=0.2,
 							F_low_threshold=0,F_high_threshold=1):
@@ -57,101 +118,118 @@ class TradesAnalyser():
 		self.locate_fee = locate_fee
 		self.commission = commission
 
-	def runFiltering(self):
-		def make_filter_prevol(threshold):
-		     return lambda ad: ad['stats']['volPre'] >= threshold
-
-		def make_filter_open_dolar(threshold):
-		     return lambda ad: ad['stats']['openValue'] >= threshold
-
-		def make_filter_gap(threshold):
-		    return lambda ad: ad['stats']['gap'] >= threshold
-
-		def make_filter_F(low_threshold, high_threshold):
-		    return lambda ad: low_threshold <= ad['stats']['volPre']/ad['freefloat'] <= high_threshold
-
-		prevol_greater_than = make_filter_prevol(self.prevol_threshold)
-		open_greater_than_dolar = make_filter_open_dolar(self.open_dolar_threshold)
-		gap_greater_than = make_filter_gap(self.gap_threshold)
-		F_between = make_filter_F(self.F_low_threshold,self.F_high_threshold)
+	def setIntrabarResolution(self, fine_root=None, label='end'):
+		'''
+		Liga (fine_root = diretório dos dados finos, ver Intrabar.FineDayLoader) ou desliga (None) a
+		resolução intrabar: depois de cada simulação, os trades em que a barra de minuto não diz se o
+		stop ou o target veio primeiro são refeitos com dados mais finos, carregados só para esses dias.
+		label é a convenção do time das barras de minuto, 'end' ou 'start' (ver Intrabar.resolveTrade).
+		'''
+		self.fine_loader = FineDayLoader(fine_root) if fine_root is not None else None
+		self.fine_label = label
+
+	def setFreeFloatHistory(self, history, max_age=None):
+		'''
+		Troca o free float de todos os ativo-dias pelo do último snapshot até cada dia, de um
+		FreeFloat.FreeFloatHistory (ver FreeFloatHistory.asOf); os ativo-dias sem snapshot ficam com NaN
+		e não passam mais no filtro do fator F. Vale para as próximas filtragens, inclusive dos grupos.
+		A tabela recebida no construtor não muda: o analyser passa a ter a sua própria tabela, com as mesmas
+		colunas (sem copiar os arrays) e o freefloat novo.
+		'''
+		self.adt = AtivoDiaTable(self.adt.columns)
+		self.adt.setColumn('freefloat', history.asOf(self.adt['name'], self.adt['date'], max_age))
+		self.adl = None # os dicts da lista têm o free float antigo, os filtrados passam a vir da tabela
+
+	def _resolveIntrabar(self):
+		if self.fine_loader is None:
+			return
+		self.trades, self.intrabar_report = resolveTrades(self.trades, self.fine_loader, self.exit_target,
+															self.exit_stop, self.fine_label)
+		self.n_trades = sum(x['trade'] is not None for x in self.trades)
 
-		filtered_ativo_dias =  filter(prevol_greater_than, self.adl)
-		filtered_ativo_dias =  filter(open_greater_than_dolar, filtered_ativo_dias)
-		filtered_ativo_dias =  filter(gap_greater_than, filtered_ativo_dias)
-		filtered_ativo_dias =  filter(F_between, filtered_ativo_dias)
-		self.fad = list(filtered_ativo_dias)
+	def _sweepIntrabar(self, batch, combo, union, exit_target, exit_stop):
+		# profits de uma combinação do sweep em todos os dias da união, com a resolução intrabar
+		days = np.flatnonzero(combo['has_trade'])
+		trades = [{'name': union[d]['name'], 'date': union[d]['date'], 'trade': trade}
+					for d, trade in zip(days, te.toTradeDicts(batch, combo, days))]
+		trades, report = resolveTrades(trades, self.fine_loader, exit_target, exit_stop, self.fine_label)
+		profit = combo['profit'].copy()
+		profit[days] = [t['trade']['profit'] for t in trades]
+		return profit, report
+
+	@timed('filtering')
+	def runFiltering(self):
+		# cada critério é uma máscara booleana sobre a tabela de ativo-dias, e a tabela guarda as máscaras
+		# de cada limiar, então num sweep só os limiares novos custam alguma coisa
+		adt = self.adt
+		mask = adt.mask('volPre', '>=', self.prevol_threshold) # prevol_greater_than
+		mask = mask & adt.mask('openValue', '>=', self.open_dolar_threshold) # open_greater_than_dolar
+		mask = mask & adt.mask('gap', '>=', self.gap_threshold) # gap_greater_than
+		mask = mask & adt.mask('F', '>=', self.F_low_threshold) & adt.mask('F', '<=', self.F_high_threshold) # F_between
+		self.fad_idx = np.flatnonzero(mask) # posições dos ativo-dias filtrados na tabela
+		self.fad = self._ativoDias(self.fad_idx)
+
+	def _ativoDias(self, idx):
+		# ativo-dias nas posições idx, no formato de dict
+		if self.adl is not None:
+			return [self.adl[i] for i in idx]
+		return self.adt.toList(idx)
 
 	def getFilteredDays(self):
-		# vamos primeiramente criar um dataframe vazio, mas com as colunas bem definidas
-		df = pd.DataFrame({'name':[],
-		                   'date':[],
-		                   'freefloat':[],
-		                   'volPre':[],
-		                   'gap':[],
-		                   'openToSpike%':[],
-		                   'minsToSpike':[],
-		                   'volToSpike':[],
-		                   'spikeToLow%':[],
-		                   'minsToLowAfterSpike':[],
-		                   'spikeToPreVolF':[],
-		                   'factorF':[]})
-		# agora popula esse dataframe com todos AtivosXDia que passaram nos critérios
-		for ad in self.fad:
-		    secondsToSpike = datetime.datetime.combine(datetime.date.today(), ad['stats']['highCoreTime']) - datetime.datetime.combine(datetime.date.today(), datetime.time(9,31))
-		    minutesToLowAfterSpike = datetime.datetime.combine(datetime.date.today(), ad['stats']['lowAfterHighTime']) - datetime.datetime.combine(datetime.date.today(), ad['stats']['highCoreTime'])
-
-		    df = df.append({'name':ad['name'],
-		                       'date':ad['date'], #.strftime("%d/%m/%Y"),
-		                       'freefloat':ad['freefloat'],
-		                       'volPre':ad['stats']['volPre'],
-		                       'gap':ad['stats']['gap'],
-		                       'openToSpike%':ad['stats']['openToSpikePercent'],
-		                       'minsToSpike':secondsToSpike.total_seconds()/60,
-		                       'volToSpike':ad['stats']['volumeToSpike'],
-		                       'spikeToLow%':ad['stats']['spikeToLowPercent'],
-		                       'minsToLowAfterSpike':minutesToLowAfterSpike.total_seconds()/60,
-		                       'spikeToPreVolF':ad['stats']['spikeToPreVolFactor'],
-		                       'factorF':ad['stats']['moneyVolPre']/ad['freefloat']},
-		                          ignore_index=True)
-		df.date = pd.to_datetime(df.date)
+		# o dataframe sai direto das colunas da tabela nas posições filtradas, sem um append por ativo-dia
+		# os tempos na tabela já estão em minutos do dia, então as diferenças de horário são só subtrações
+		adt, idx = self.adt, self.fad_idx
+		highCore = adt['highCoreTime'][idx]
+		df = pd.DataFrame({'name':adt['name'][idx].astype(object),
+		                   'date':pd.to_datetime(adt['date'][idx]),
+		                   'freefloat':adt['freefloat'][idx].astype('float64'),
+		                   'volPre':adt['volPre'][idx].astype('float64'),
+		                   'gap':adt['gap'][idx],
+		                   'openToSpike%':adt['openToSpikePercent'][idx],
+		                   'minsToSpike':(highCore - MARKET_OPEN).astype('float64'),
+		                   'volToSpike':adt['volumeToSpike'][idx].astype('float64'),
+		                   'spikeToLow%':adt['spikeToLowPercent'][idx],
+		                   'minsToLowAfterSpike':(adt['lowAfterHighTime'][idx] - highCore).astype('float64'),
+		                   'spikeToPreVolF':adt['spikeToPreVolFactor'][idx],
+		                   'factorF':adt['moneyVolPre'][idx]/adt['freefloat'][idx]})
 		return df
 
+	def __setattr__(self, name, value):
+		if name in TradesAnalyser.LEDGER_INPUTS:
+			self.__dict__['_ledger'] = None
+		object.__setattr__(self, name, value)
+
 	def getTrades(self):
-		df = pd.DataFrame({ 'name':[],
-		                    'date':[],
-		                    'entry_time':[],
-		                    'mins_to_trade':[],
-		                    'exit_time':[],
-		                    'price':[],
-		                    'stop':[],
-		                    'target':[],
-		                    'profit':[]})
-		for t in self.trades:
-		    if t['trade']:
-		        secondsToTrade = t['trade']['entry']['time'] - datetime.datetime.combine( t['trade']['entry']['time'].date(), datetime.time(9,31) )
-		        df = df.append({ 'name':t['name'],
-		                         'date':t['date'], #.strftime("%d/%m/%Y"), datetime é melhor que string
-		                         'entry_time':t['trade']['entry']['time'].strftime("%H:%M"),
-		                         'mins_to_trade':secondsToTrade.total_seconds()/60,
-		                         'exit_time':t['trade']['exit']['time'].strftime("%H:%M"),
-		                         'price':t['trade']['price'],
-		                         'stop':t['trade']['stop'],
-		                         'target':t['trade']['target'],
-		                         'profit':t['trade']['profit']},
-		                       ignore_index=True)
+		# o DataFrame de trades só é recalculado quando trades, start_money, allocation, locate_fee ou
+		# commission mudam (ver __setattr__); obs: mexer na lista self.trades in place não invalida o cache.
+		# devolvemos uma cópia pra quem chamar poder mexer no df à vontade
+		if self._ledger is None:
+			self._ledger = self._buildTrades()
+		return self._ledger.copy()
+
+	@timed('get_trades', count=len)
+	def _buildTrades(self):
+		# colunas montadas de uma vez a partir dos trades, e os horários em minutos do dia (vetorizado)
+		tt = [t for t in self.trades if t['trade']]
+		entry = np.array([timeToMinute(t['trade']['entry']['time']) for t in tt], dtype='int64')
+		exit = np.array([timeToMinute(t['trade']['exit']['time']) for t in tt], dtype='int64')
+		df = pd.DataFrame({ 'name':np.array([t['name'] for t in tt], dtype=object),
+		                    'date':np.array([t['date'] for t in tt], dtype=object),
+		                    'entry_time':HHMM[entry],
+		                    'mins_to_trade':(entry - MARKET_OPEN).astype('float64'),
+		                    'exit_time':HHMM[exit],
+		                    'price':np.array([t['trade']['price'] for t in tt], dtype='float64'),
+		                    'stop':np.array([t['trade']['stop'] for t in tt], dtype='float64'),
+		                    'target':np.array([t['trade']['target'] for t in tt], dtype='float64'),
+		                    'profit':np.array([t['trade']['profit'] for t in tt], dtype='float64')})
 		df = df.sort_values(by='date',ignore_index=True)
 		df['cum_profit'] = (1+self.allocation*df['profit']).cumprod()
 		#df.index = list( range(0,len(df)) ) # depois da versão 1.0 de pandas podemos usar 
 											# sort_values(by='date',ignore_index=True)
-		df['equity_real'] = pd.Series(0, index=df.index, dtype='float64')
-		df['profit_real'] = pd.Series(0, index=df.index, dtype='float64')
-
-		value = self.start_money
-		for index, row in df.iterrows():
-			anterior = value # vamos armazenar anterior pra calcular 'profit_real'
-			value = value + (value*self.allocation)*row['profit'] - value*self.allocation*self.locate_fee - self.commission
-			df.at[index,'equity_real'] = value
-			df.at[index,'profit_real'] = value/anterior-1 # curiosidade: a commission vai sendo diluida à medida dos trades
+		# equity em forma fechada, sem o loop de iterrows (ver Utilities.equityCurve)
+		# curiosidade: a commission vai sendo diluida à medida dos trades
+		df['equity_real'], df['profit_real'] = equityCurve(df['profit'], self.start_money, self.allocation,
+															self.locate_fee, self.commission)
 
 		df['cum_profit_real'] = df['equity_real']/self.start_money
 
@@ -159,33 +237,31 @@ class TradesAnalyser():
 		return df
 
 	def runSimulation(self):
+		# os dias são carregados agrupados por ticker (cada arquivo aberto uma vez só),
+		# e os que já foram carregados em simulações anteriores não são lidos de novo
+		self.loader.resetCounters()
+		intras = self.loader.load(self.fad)
+		self.io_stats = {'files':self.loader.files_read, 'bytes':self.loader.bytes_read}
+
+		# todos os dias filtrados passam de uma vez pelo motor vetorizado, que dá os mesmos
+		# resultados que chamar intra.checkForTrade dia a dia
+		batch = te.CoreBatch(intras)
+		res = te.checkForTrades(batch, self.short_after, self.exit_target, self.exit_stop)
+
 		trades = []
-		for ad in self.fad:
-		    # a = at.Ativo(ad['name'],self.fm[ad['name']])
-		    # intra = a.fromDay(ad['date'])
-		    intra = at.Ativo.initIntradayFromDate(ad['name'],self.fm[ad['name']],ad['date'])
+		for ad, trade in zip(self.fad, te.toTradeDicts(batch, res)):
 		    trades.append({'name': ad['name'],
 		                   'date': ad['date'],
-		                   'trade': intra.checkForTrade(self.short_after, self.exit_target, self.exit_stop)})
+		                   'trade': trade})
 		self.trades = trades
 		# vamos contar o número de non-None trades.
 		# https://stackoverflow.com/questions/29422691/how-to-count-the-number-of-occurrences-of-none-in-a-list
 		self.n_trades = sum(x['trade'] is not None for x in self.trades)
+		self._resolveIntrabar()
 
-	def runSimulationGroup(self,
-							prevol_threshold=[800000],
-							open_dolar_threshold=[2],
-							gap_threshold=[0.2],
-							F_low_threshold=[0],
-							F_high_threshold=[1],
-							short_after = [0.1],
-							exit_target = [0.3],
-							exit_stop = [0.3],
-							start_money = [10000],
-							allocation=[0.1],
-							locate_fee=[0.02],
-							commission=[2]):
-
+	def _makeParsList(self, prevol_threshold=[800000], open_dolar_threshold=[2], gap_threshold=[0.2],
+						F_low_threshold=[0], F_high_threshold=[1], short_after=[0.1], exit_target=[0.3],
+						exit_stop=[0.3], start_money=[10000], allocation=[0.1], locate_fee=[0.02], commission=[2]):
 		parametros = [
 			[a,b,c,d,e,f,g,h,i,j,k,l]
 			for a in prevol_threshold 
@@ -219,42 +295,348 @@ class TradesAnalyser():
 		        'commission':l[11]
 		    }
 		    parslist.append(pars)
-		parslist
+		return parslist
+
+	def _setPars(self, p):
+		self.setFilterParameters(prevol_threshold=p['prevol_threshold'],
+								open_dolar_threshold=p['open_dolar_threshold'],
+								gap_threshold=p['gap_threshold'],
+								F_low_threshold=p['F_low_threshold'],
+								F_high_threshold=p['F_high_threshold'])
+		self.setAlgoParameters(short_after = p['short_after'],
+								exit_target = p['exit_target'],
+								exit_stop = p['exit_stop'])
+		self.setSimParameters(start_money = p['start_money'],
+							allocation = p['allocation'],
+							locate_fee=p['locate_fee'],
+							commission=p['commission'])
+
+	def _filteredUnion(self, parslist):
+		# junta os ativo-dias de todas as combinações de filtros de parslist
+		filtros = ['prevol_threshold','open_dolar_threshold','gap_threshold','F_low_threshold','F_high_threshold']
+		union = {}
+		for fp in {tuple(p[f] for f in filtros) for p in parslist}:
+			self.setFilterParameters(*fp)
+			self.runFiltering()
+			union.update({(ad['name'], ad['date']): ad for ad in self.fad})
+		return list(union.values())
+
+	def _loadFilteredUnion(self, parslist):
+		# carrega de uma vez os ativo-dias de todas as combinações de filtros,
+		# assim cada arquivo é aberto uma única vez no grupo inteiro e as simulações só reutilizam os dias
+		union = self._filteredUnion(parslist)
+		self.loader.resetCounters()
+		self.loader.load(union)
+		self.io_stats = {'files':self.loader.files_read, 'bytes':self.loader.bytes_read}
+		print(f"{self.io_stats['files']} arquivos e {self.io_stats['bytes']/1e6:.1f} MB lidos para {len(union)} ativo-dias.")
+		return union
+
+	def _pendingPars(self, parslist, ckpt):
+		# combinações que ainda não estão no checkpoint (todas, se não tiver checkpoint)
+		if ckpt is None:
+			return parslist
+		todo = [p for p in parslist if not ckpt.isDone(p)]
+		print(f"{len(parslist)-len(todo)} combinações já estavam em {ckpt.filename}, faltam {len(todo)}.")
+		return todo
+
+	def _addResult(self, p, row, ckpt, rows):
+		# sem checkpoint a linha fica em rows, com checkpoint vai para o disco
+		# e as linhas são lidas de volta no final, na ordem de parslist, por _finishResults
+		if ckpt is None:
+			rows.append(row)
+		else:
+			ckpt.append(p, row)
+
+	def _finishResults(self, parslist, ckpt, rows):
+		# as linhas novas entram em self.results com um concat só, em vez de um append por combinação
+		if ckpt is not None:
+			rows = [ckpt.results(parslist)]
+		self.results = pd.concat([self.results] + rows, ignore_index=True)
+
+	def runSimulationGroup(self,
+							prevol_threshold=[800000],
+							open_dolar_threshold=[2],
+							gap_threshold=[0.2],
+							F_low_threshold=[0],
+							F_high_threshold=[1],
+							short_after = [0.1],
+							exit_target = [0.3],
+							exit_stop = [0.3],
+							start_money = [10000],
+							allocation=[0.1],
+							locate_fee=[0.02],
+							commission=[2],
+							seed=0,
+							checkpoint=None):
+		'''
+		checkpoint: nome de um arquivo csv (Utilities.GroupCheckpoint). Se for passado, cada combinação é
+		gravada no arquivo assim que termina e as combinações que já estão nele não são simuladas de novo.
+		O bootstrap de cada combinação usa a seed seed+índice em parslist, como em runSimulationGroupParallel,
+		então os três runners (e um grupo retomado do checkpoint) dão as mesmas linhas.
+		'''
+		parslist = self._makeParsList(prevol_threshold, open_dolar_threshold, gap_threshold, F_low_threshold,
+									F_high_threshold, short_after, exit_target, exit_stop, start_money,
+									allocation, locate_fee, commission)
 
 		print(f"Simulando {len(parslist)} combinações de parâmetros.")
+		TIMER.reset()
+		ckpt = GroupCheckpoint(checkpoint) if checkpoint else None
+		todo = self._pendingPars(parslist, ckpt)
 
-		for p in parslist:
-			self.setFilterParameters(prevol_threshold=p['prevol_threshold'],
-									open_dolar_threshold=p['open_dolar_threshold'],
-									gap_threshold=p['gap_threshold'],
-									F_low_threshold=p['F_low_threshold'],
-									F_high_threshold=p['F_high_threshold'])
+		self._loadFilteredUnion(todo)
+		group_io = self.io_stats
+
+		rows = []
+		start = datetime.datetime.now()
+		for done, p in enumerate(todo, 1):
+			self._setPars(p)
 			self.runFiltering()
-				
-			self.setAlgoParameters(short_after = p['short_after'],
-									exit_target = p['exit_target'],
-									exit_stop = p['exit_stop'])
-			self.setSimParameters(start_money = p['start_money'],
-								allocation = p['allocation'],
-								locate_fee=p['locate_fee'],
-								commission=p['commission'])
-
-			now = datetime.datetime.now()
-			now_str = now.strftime("%d/%m/%Y %H:%M:%S")
-			print("running another simulation.", now_str)
 			self.runSimulation()
 
-			self.results = self.results.append(self.getSimResults(),ignore_index=True)
-
+			self._addResult(p, self.getSimResults(seed=seed + parslist.index(p)), ckpt, rows)
+			printProgress(done, len(todo), start)
+
+		self._finishResults(parslist, ckpt, rows)
+		self.timings = TIMER.report()
+		self.io_stats = group_io
+
+	def runSimulationGroupParallel(self, workers=None, progress=printProgress, seed=0, checkpoint=None, **grid):
+		'''
+		Versão paralela de runSimulationGroup: as combinações de parâmetros são divididas entre
+		workers processos (None = número de CPUs). grid recebe as mesmas listas de runSimulationGroup.
+		Os ativo-dias vão para os workers por shared memory (Parallel.SharedColumns) e as barras
+		pelo cache mmap do FileManager, então nada grande é picklado para os processos.
+		As linhas de self.results ficam na ordem das combinações, não na ordem em que terminaram,
+		e o bootstrap de cada combinação usa a seed seed+índice, então o resultado não depende
+		do número de workers. progress(done, total, start) é chamado a cada combinação terminada.
+		checkpoint funciona como em runSimulationGroup, quem grava as linhas é o processo principal.
+		'''
+		parslist = self._makeParsList(**grid)
+		print(f"Simulando {len(parslist)} combinações de parâmetros em paralelo.")
+		TIMER.reset()
+		ckpt = GroupCheckpoint(checkpoint) if checkpoint else None
+		todo = self._pendingPars(parslist, ckpt)
+
+		# garante que o cache binário de todos os tickers existe antes de abrir os workers,
+		# senão vários processos iam parsear o mesmo csv ao mesmo tempo
+		union = self._filteredUnion(todo)
+		for name in sorted({ad['name'] for ad in union}):
+			self.fm.getBars(name)
+
+		shared = par.SharedColumns.create(par.tableColumns(self.adt))
+		# a resolução intrabar vai junto para os workers, que refazem os trades ambíguos como runSimulation
+		intrabar = (self.fine_loader.root, self.fine_label) if self.fine_loader is not None else None
+		rows = [None]*len(parslist)
+		start = datetime.datetime.now()
+		try:
+			with ProcessPoolExecutor(max_workers=workers, initializer=par._initWorker,
+									initargs=(shared.spec, self.fm.config(), intrabar)) as ex:
+				# a seed usa o índice em parslist (e não em todo) pra não mudar quando retomamos um checkpoint
+				futures = [ex.submit(par._runCombo, (i, p, seed + i)) for i, p in enumerate(parslist) if p in todo]
+				for done, f in enumerate(as_completed(futures), 1):
+					i, row, stages = f.result()
+					TIMER.merge(stages) # tempos medidos no worker
+					rows[i] = row
+					if ckpt is not None:
+						ckpt.append(parslist[i], row)
+					if progress:
+						progress(done, len(todo), start)
+		finally:
+			shared.close(unlink=True)
+
+		self._finishResults(parslist, ckpt, rows)
+		self.timings = TIMER.report()
+
+	def runSweep(self,
+				prevol_threshold=[800000],
+				open_dolar_threshold=[2],
+				gap_threshold=[0.2],
+				F_low_threshold=[0],
+				F_high_threshold=[1],
+				short_after = [0.1],
+				exit_target = [0.3],
+				exit_stop = [0.3],
+				start_money = [10000],
+				allocation=[0.1],
+				locate_fee=[0.02],
+				commission=[2],
+				seed=0,
+				checkpoint=None):
+		'''
+		Mesmo resultado de runSimulationGroup (mesmas linhas, na mesma ordem, em self.results), mas cada
+		ativo-dia é carregado uma vez só e o motor de trades roda uma única vez para todas as combinações
+		de short_after, exit_target e exit_stop ao mesmo tempo (TradeEngine.sweepTrades).
+		Cada combinação depois só filtra os dias e pega os trades já calculados.
+		checkpoint e seed funcionam como em runSimulationGroup.
+		'''
+		parslist = self._makeParsList(prevol_threshold, open_dolar_threshold, gap_threshold, F_low_threshold,
+									F_high_threshold, short_after, exit_target, exit_stop, start_money,
+									allocation, locate_fee, commission)
+
+		print(f"Simulando {len(parslist)} combinações de parâmetros (sweep).")
+		TIMER.reset()
+		ckpt = GroupCheckpoint(checkpoint) if checkpoint else None
+		todo = self._pendingPars(parslist, ckpt)
+
+		union = self._loadFilteredUnion(todo)
+		group_io = self.io_stats
+		batch = te.CoreBatch(self.loader.load(union))
+		position = {(ad['name'], ad['date']): k for k, ad in enumerate(union)} # posição de cada ativo-dia no batch
+		sweep = te.sweepTrades(batch, short_after, exit_target, exit_stop)
+
+		rows = []
+		for p in todo:
+			self._setPars(p)
+			self.runFiltering()
 
-	def saveTrades(self,filename):
-		with open(filename, 'wb') as filehandle: # w de write e b de binary
-		    pickle.dump(self.trades,filehandle)
+			combo = te.selectCombo(sweep, list(short_after).index(p['short_after']),
+										list(exit_target).index(p['exit_target']),
+										list(exit_stop).index(p['exit_stop']))
+			days = [position[(ad['name'], ad['date'])] for ad in self.fad]
+			self.trades = [{'name': ad['name'], 'date': ad['date'], 'trade': trade}
+							for ad, trade in zip(self.fad, te.toTradeDicts(batch, combo, days))]
+			self.n_trades = sum(x['trade'] is not None for x in self.trades)
+			self._resolveIntrabar()
+
+			self._addResult(p, self.getSimResults(seed=seed + parslist.index(p)), ckpt, rows)
+
+		self._finishResults(parslist, ckpt, rows)
+		self.timings = TIMER.report()
+		self.io_stats = group_io
+
+
+	def runPortfolio(self, max_positions=10):
+		'''
+		Simula os trades da última simulação como uma carteira (Portfolio), com os parâmetros de
+		setSimParameters: trades simultâneos disputam o caixa e no máximo max_positions ficam abertos.
+		Devolve o Portfolio, com o ledger, a curva de equity e o número de entradas puladas.
+		'''
+		self.portfolio = Portfolio(self.start_money, self.allocation, self.locate_fee, self.commission,
+									max_positions).run(self.trades)
+		return self.portfolio
+
+	def runWalkForward(self, train_days=250, test_days=60, step=None, score=None,
+						prevol_threshold=[800000], open_dolar_threshold=[2], gap_threshold=[0.2],
+						F_low_threshold=[0], F_high_threshold=[1], short_after=[0.1], exit_target=[0.3],
+						exit_stop=[0.3], start_money=[10000], allocation=[0.1], locate_fee=[0.02], commission=[2]):
+		'''
+		Walk-forward sobre a grade de parâmetros (mesmas listas de runSimulationGroup).
+		Os dias de pregão do histórico são divididos em janelas de treino de train_days dias seguidas de
+		teste de test_days dias, andando step dias (por padrão test_days). Em cada janela é escolhida a
+		combinação com maior score no treino, e ela é aplicada no teste, que fica fora da amostra.
+		Nada é simulado por janela: os resultados de todos os ativo-dias para toda a grade são calculados
+		uma vez só (TradeEngine.sweepTrades, como em runSweep) e cada janela só fatia esses resultados.
+		score(profit, p) recebe os profits dos trades da janela (em ordem de data) e os parâmetros, e por
+		padrão é o retorno da equity de getTrades (Utilities.equityCurve).
+		Resultados em self.wf_results (uma linha por janela) e self.wf_equity (trades fora da amostra com
+		a equity emendada de uma janela para a outra, começando em start_money da primeira escolha).
+		'''
+		if score is None:
+			def score(profit, p):
+				if len(profit) == 0:
+					return 0.0
+				equity = equityCurve(profit, p['start_money'], p['allocation'], p['locate_fee'], p['commission'])[0]
+				return equity[-1]/p['start_money'] - 1
+
+		parslist = self._makeParsList(prevol_threshold, open_dolar_threshold, gap_threshold, F_low_threshold,
+									F_high_threshold, short_after, exit_target, exit_stop, start_money,
+									allocation, locate_fee, commission)
+		print(f"Walk-forward com {len(parslist)} combinações de parâmetros.")
+		TIMER.reset()
+
+		# ativo-dias de cada combinação de filtros, como posições na tabela, e a união de todas
+		filtros = ['prevol_threshold','open_dolar_threshold','gap_threshold','F_low_threshold','F_high_threshold']
+		filtered = {}
+		for fp in {tuple(p[f] for f in filtros) for p in parslist}:
+			self.setFilterParameters(*fp)
+			self.runFiltering()
+			filtered[fp] = self.fad_idx
+		upos = np.unique(np.concatenate(list(filtered.values()))) if filtered else np.zeros(0, dtype='int64')
+		member = {fp: np.isin(upos, idx) for fp, idx in filtered.items()} # dia da união passa no filtro fp
+
+		# o motor roda uma vez só para todos os dias da união e toda a grade de short_after, exit_target e exit_stop
+		union = self._ativoDias(upos)
+		self.loader.resetCounters()
+		batch = te.CoreBatch(self.loader.load(union))
+		sweep = te.sweepTrades(batch, short_after, exit_target, exit_stop)
+
+		dates = self.adt['date'][upos]
+		order = np.argsort(dates, kind='stable') # ordem de data, como em getTrades
+		# o calendário é o de todos os dias da tabela (e não só os da união), então as janelas não
+		# dependem da grade nem de quão esparso é o filtro
+		days = np.unique(self.adt['date'])
+		windows = rollingWindows(len(days), train_days, test_days, step)
+
+		# profit de cada combinação em todos os dias da união, já em ordem de data, e quais dias tiveram trade
+		# com a resolução intrabar ligada, os trades ambíguos de cada (i, j, k) são refeitos uma vez só
+		profit, traded = [], []
+		resolved = {}
+		self.intrabar_report = {}
+		for p in parslist:
+			i, j, k = (list(short_after).index(p['short_after']), list(exit_target).index(p['exit_target']),
+						list(exit_stop).index(p['exit_stop']))
+			fp = tuple(p[f] for f in filtros)
+			if self.fine_loader is None:
+				profit.append(sweep['profit'][i,j,k][order])
+			else:
+				if (i, j, k) not in resolved:
+					resolved[(i, j, k)], report = self._sweepIntrabar(batch, te.selectCombo(sweep, i, j, k), union,
+																		p['exit_target'], p['exit_stop'])
+					for key, v in report.items():
+						self.intrabar_report[key] = self.intrabar_report.get(key, 0) + v
+				profit.append(resolved[(i, j, k)][order])
+			traded.append((member[fp] & sweep['has_trade'][i,j,k])[order])
+		sorted_dates = dates[order]
+
+		rows, oos = [], []
+		money = None
+		for a, b, c in windows:
+			train = (sorted_dates >= days[a]) & (sorted_dates < days[b])
+			test = (sorted_dates >= days[b]) & (sorted_dates <= days[c-1])
+			scores = [score(profit[n][train & traded[n]], p) for n, p in enumerate(parslist)]
+			best = int(np.argmax(scores))
+			p = parslist[best]
+			sel = np.flatnonzero(test & traded[best])
+			start = p['start_money'] if money is None else money
+			equity = equityCurve(profit[best][sel], start, p['allocation'], p['locate_fee'], p['commission'])[0]
+			money = equity[-1] if len(equity) else start
+
+			rows.append(dict(p, train_start=pd.Timestamp(days[a]), train_end=pd.Timestamp(days[b-1]),
+							test_start=pd.Timestamp(days[b]), test_end=pd.Timestamp(days[c-1]),
+							train_score=scores[best], test_score=score(profit[best][sel], p),
+							n_test_trades=len(sel), end_money=money))
+			oos.append(pd.DataFrame({'window':len(rows)-1,
+									'name':[union[order[n]]['name'] for n in sel],
+									'date':pd.to_datetime(sorted_dates[sel]),
+									'profit':profit[best][sel],
+									'equity_real':equity}))
+
+		self.wf_results = pd.DataFrame(rows)
+		self.wf_equity = pd.concat(oos, ignore_index=True) if oos else pd.DataFrame()
+		self.timings = TIMER.report()
+		return self.wf_results
+
+	def saveTrades(self, filename, append=False):
+		'''
+		filename .pkl grava o pickle antigo; qualquer outro nome grava no formato colunar (ColumnStore,
+		colunas TradeEngine.TRADE_COLUMNS), e com append=True os trades vão no final do que já está lá
+		'''
+		if isPickle(filename):
+			with open(filename, 'wb') as filehandle: # w de write e b de binary
+			    pickle.dump(self.trades,filehandle)
+			return
+		store = ColumnStore(filename)
+		if not append:
+			store.clear()
+		store.append(te.tradesToColumns(self.trades))
 
 	def openTrades(self,filename):
-		with open(filename, 'rb') as filehandle: # w de read e b de binary
-		    self.trades = pickle.load(filehandle)
-		    self.n_trades = sum(x['trade'] is not None for x in self.trades)
+		if isPickle(filename):
+			with open(filename, 'rb') as filehandle: # w de read e b de binary
+			    self.trades = pickle.load(filehandle)
+		else:
+			self.trades = te.columnsToTrades(ColumnStore(filename).read())
+		self.n_trades = sum(x['trade'] is not None for x in self.trades)
 
 	def printSimResults(self):
 
@@ -288,8 +670,8 @@ class TradesAnalyser():
 		print('Number of Trades:', self.n_trades)
 		print('Number of filtered ativo-dias:', len(self.fad) )
 
-	def getSimResults(self):
-		self.runBootstrap(n_iter=50, replace=False)
+	def getSimResults(self, seed=None):
+		self.runBootstrap(n_iter=50, replace=False, seed=seed)
 		bsr = self.getBootstrapResults()
 
 		df = pd.DataFrame({ 'prevol_threshold':self.prevol_threshold,
@@ -343,47 +725,81 @@ class TradesAnalyser():
 
 		return drawdown(s)
 
-	def saveGroupResults(self,filename):
-		with open(filename, 'wb') as filehandle: # w de write e b de binary
-		    pickle.dump(self.results,filehandle)
-
-	def openGroupResults(self,filename):
-		with open(filename, 'rb') as filehandle: # w de read e b de binary
-			loaded = pickle.load(filehandle)
-			self.results = self.results.append(loaded,ignore_index=True)
-
-	def runBootstrap(self, n_iter=50, replace=False):
-		self.bsl = []
+	def saveGroupResults(self, filename, append=False):
+		'''
+		como saveTrades: .pkl é o pickle antigo, outro nome é o formato colunar (uma coluna por coluna de
+		self.results), e com append=True as linhas vão no final, sem reescrever o que já foi gravado
+		'''
+		if isPickle(filename):
+			with open(filename, 'wb') as filehandle: # w de write e b de binary
+			    pickle.dump(self.results,filehandle)
+			return
+		store = ColumnStore(filename)
+		if not append:
+			store.clear()
+		store.append({c: self.results[c].to_numpy() for c in self.results.columns})
+
+	def openGroupResults(self, filename, columns=None):
+		'''
+		acrescenta em self.results os resultados gravados em filename
+		columns permite ler só algumas colunas do formato colunar
+		'''
+		if isPickle(filename):
+			with open(filename, 'rb') as filehandle: # w de read e b de binary
+				loaded = pickle.load(filehandle)
+		else:
+			loaded = pd.DataFrame(ColumnStore(filename).read(columns))
+		self.results = pd.concat([self.results, loaded], ignore_index=True)
+
+	@timed('bootstrap')
+	def runBootstrap(self, n_iter=50, replace=False, seed=None):
+		'''
+		Reamostra a ordem dos trades n_iter vezes. Em vez de um DataFrame por iteração, sorteamos de uma vez
+		uma matriz de índices (n_iter x n_trades) com um numpy.random.Generator (seed permite repetir o sorteio)
+		e a equity de todas as iterações sai de um cumprod só. replace=False são permutações, replace=True
+		é bootstrap com reposição.
+		'''
 		s = self.getTrades()
 
 		self.bs_base = s[['profit_real', 'cum_profit_real']]
 
-		prb = self.bs_base['profit_real'] # Profit Real do Base case (PRB)
+		prb = self.bs_base['profit_real'].to_numpy() # Profit Real do Base case (PRB)
 
-		for i in range(0,n_iter):
-			random_pr = prb.sample(n = prb.size, replace=replace).reset_index(drop=True)
-			random_bs = pd.DataFrame({
-										'profit_real':random_pr,
-										'cum_profit_real':(1+random_pr).cumprod()
-									})
+		rng = np.random.default_rng(seed)
+		if replace:
+			idx = rng.integers(0, prb.size, size=(n_iter, prb.size))
+		else:
+			idx = rng.permuted(np.tile(np.arange(prb.size), (n_iter, 1)), axis=1) # uma permutação por linha
 
-			self.bsl.append(random_bs)
-
-	def getBootstrapResults(self):
+		self.bs_profit = prb[idx]
+		self.bs_cum = np.cumprod(1 + self.bs_profit, axis=1)
 
-		dd_res = [] # DrawDown Results
+	@property
+	def bsl(self):
+		# Boot Strap List: a lista antiga com um dataframe por iteração, montada a partir das matrizes
+		return [pd.DataFrame({'profit_real':pr, 'cum_profit_real':cpr}) for pr, cpr in zip(self.bs_profit, self.bs_cum)]
 
-		for bs in self.bsl: 
-			cpr = bs['cum_profit_real']
-			dd_res.append( drawdown(cpr) )
+	def getBootstrapResults(self):
+		# uma linha por iteração do bootstrap, o drawdown de todas as curvas sai de uma vez só (maxDrawdowns)
+		n_iter = self.bs_cum.shape[0]
+		if self.bs_cum.shape[1] == 0:
+			return pd.DataFrame({'max_drawdown':np.full(n_iter, np.nan), 'end_cum_profit':np.full(n_iter, np.nan)})
 
 		# Results DataFrame
 		bs_res = pd.DataFrame({
-									'max_drawdown':dd_res,
+									'max_drawdown':maxDrawdowns(self.bs_cum),
+									'end_cum_profit':self.bs_cum[:,-1],
 								})
 
 		return bs_res
 
+	def getBootstrapPercentiles(self, q=[5, 25, 50, 75, 95]):
+		'''
+		percentis do máximo drawdown e do cum_profit_real final entre as iterações do bootstrap
+		'''
+		bsr = self.getBootstrapResults()
+		return pd.DataFrame({c: np.percentile(bsr[c], q) for c in bsr.columns}, index=[f"p{p}" for p in q])
+
 	def printBootstrapResults(self):
 
 		bsr = self.getBootstrapResults()
@@ -392,6 +808,8 @@ class TradesAnalyser():
 		print('maximum maximum drawdown', bsr['max_drawdown'].max() )
 		print('minimum maximum drawdown', bsr['max_drawdown'].min() )
 		print('mean maximum drawdown', bsr['max_drawdown'].mean() )
+		print('percentis')
+		print(self.getBootstrapPercentiles())
 
 	def __repr__(self):
 		s='FILTERING PARAMETERS\n'
@@ -1,4 +1,10 @@
 import pandas as pd
+import numpy as np
+import hashlib
+import json
+import os
+from Bars import Bars
+from Profiler import timed
 
 def divideDays(bl):
 	'''
@@ -6,7 +12,12 @@ def divideDays(bl):
 	dbl: daily bar lis, list of raw data divided by days
 	the daily data will still be raw in the sense that the lines are not
 	divided among pre actual and pos market
+	if bl is a Bars container, each day is returned as a Bars slice (a view, no copy)
 	'''
+	if isinstance(bl, Bars):
+		offsets = bl.dayOffsets()
+		return [bl[offsets[k]:offsets[k+1]] for k in range(len(offsets)-1)]
+
 	dbl = []
 	temp_day = []
 	actual_day = bl[0]
@@ -26,13 +37,123 @@ def divideDays(bl):
 
 	return dbl
 
+@timed('drawdown')
 def drawdown(s):
-	dd = pd.Series(dtype='float64') # drawdown (dd) will be used to calculate maximum drawdown (mdd)
-	# especificamos explicitamente o dtype para evitar uma warning
-
-	for i in s.index:
-		_dd = s[i]/max(s[:i+1].max(),1)-1 # i+1 pois slicing não é inclusive do ultimo termo
-		# como não queremos dar append de 1 em s, usamos max(X,1) onde
-		# X = s[:i+1].max()
-		dd = dd.append( pd.Series( _dd ), ignore_index=True ) 
-	return abs( dd.min() )
\ No newline at end of file
+	'''
+	máximo drawdown de uma curva de equity s (Series ou array), em O(n) com o máximo acumulado
+	assim como antes, o pico nunca é menor que 1 (max(pico,1)), ou seja, a curva é tratada
+	como se começasse em 1
+	'''
+	s = np.asarray(s, dtype='float64')
+	if len(s) == 0:
+		return np.nan
+	peak = np.maximum(np.maximum.accumulate(s), 1) # pico até cada ponto, com o piso em 1
+	return abs( (s/peak - 1).min() )
+
+@timed('drawdown', count=len)
+def maxDrawdowns(m):
+	'''
+	versão 2D de drawdown: m é um array (n_caminhos x n_pontos), por exemplo todas as curvas do
+	bootstrap, e o retorno é o máximo drawdown de cada linha, tudo numa chamada só
+	'''
+	m = np.asarray(m, dtype='float64')
+	if m.shape[1] == 0:
+		return np.full(m.shape[0], np.nan)
+	peak = np.maximum(np.maximum.accumulate(m, axis=1), 1)
+	return np.abs( (m/peak - 1).min(axis=1) )
+
+def equityCurve(profit, start_money, allocation, locate_fee, commission):
+	'''
+	equity depois de cada trade, sem loop: a recursão do getTrades
+		value_k = value_{k-1} + value_{k-1}*allocation*profit_k - value_{k-1}*allocation*locate_fee - commission
+	é afim, value_k = m_k*value_{k-1} - commission, então com g_k = m_1*...*m_k
+		value_k = g_k*(start_money - commission*(1/g_1 + ... + 1/g_k))
+	devolve (equity, profit_real), onde profit_real_k = value_k/value_{k-1} - 1
+	'''
+	profit = np.asarray(profit, dtype='float64')
+	m = 1 + allocation*profit - allocation*locate_fee
+	equity = None
+	if (m > 0).all():
+		with np.errstate(divide='ignore', over='ignore', invalid='ignore'):
+			g = np.cumprod(m)
+			equity = g*(start_money - commission*np.cumsum(1/g))
+		if not np.isfinite(equity).all(): # em séries longas g pode sair do range do float64
+			equity = None
+	if equity is None: # algum trade zera a posição (m <= 0), aí 1/g não existe e fazemos a recursão direto
+		equity = np.empty(len(m))
+		value = start_money
+		for k in range(len(m)):
+			value = m[k]*value - commission
+			equity[k] = value
+	previous = np.concatenate(([start_money], equity[:-1]))
+	return equity, equity/previous - 1
+
+def rollingWindows(n, train, test, step=None):
+	'''
+	janelas de walk-forward sobre n períodos (por exemplo n dias de pregão): lista de (a, b, c) com
+	treino a:b e teste b:c, andando step períodos por janela (por padrão step = test, testes sem sobreposição)
+	a última janela de teste pode ser mais curta
+	'''
+	step = test if step is None else step
+	windows = []
+	a = 0
+	while a + train < n:
+		windows.append((a, a + train, min(a + train + test, n)))
+		a += step
+	return windows
+
+def parsHash(pars):
+	'''
+	hash estável de um dict de parâmetros, usado como chave de cada combinação no checkpoint
+	escalares numpy (grades feitas com np.arange, por exemplo) viram o valor python equivalente, com o mesmo hash
+	'''
+	return hashlib.sha1(json.dumps(pars, sort_keys=True, default=lambda v: v.item()).encode()).hexdigest()[:16]
+
+class GroupCheckpoint():
+	'''
+	Arquivo append-only (csv) com uma linha de getSimResults por combinação já simulada.
+	Cada linha é escrita assim que a combinação termina, com a coluna pars_hash (parsHash dos parâmetros)
+	na frente, então se o kernel cair no meio da madrugada basta rodar o grupo de novo com o mesmo
+	arquivo que as combinações já feitas são puladas.
+	------------------------------------------------------------------------------------------
+	Exemplo: an.runSimulationGroup(..., checkpoint='results_madrugada02.csv')
+	------------------------------------------------------------------------------------------
+	'''
+	def __init__(self, filename):
+		self.filename = filename
+		self.rows = {} # pars_hash -> DataFrame de 1 linha
+		if os.path.exists(filename):
+			self._load()
+
+	def _load(self):
+		# se o processo morreu no meio de uma escrita, a última linha fica pela metade: cortamos ela fora
+		with open(self.filename, 'rb+') as file:
+			data = file.read()
+			if data and not data.endswith(b'\n'):
+				file.truncate(data.rfind(b'\n') + 1)
+		if os.path.getsize(self.filename) == 0:
+			return
+		# round_trip devolve exatamente os floats gravados, então retomar o grupo dá o mesmo resultado
+		df = pd.read_csv(self.filename, float_precision='round_trip')
+		for _, row in df.iterrows():
+			self.rows[row['pars_hash']] = row.drop('pars_hash').to_frame().T.reset_index(drop=True)
+
+	def isDone(self, pars):
+		return parsHash(pars) in self.rows
+
+	def append(self, pars, result):
+		h = parsHash(pars)
+		row = result.copy()
+		row.insert(0, 'pars_hash', h)
+		header = not os.path.exists(self.filename) or os.path.getsize(self.filename) == 0
+		row.to_csv(self.filename, mode='a', header=header, index=False)
+		self.rows[h] = result
+
+	def results(self, parslist):
+		'''
+		linhas das combinações de parslist que já estão no checkpoint, na ordem de parslist
+		'''
+		rows = [self.rows[parsHash(p)] for p in parslist if self.isDone(p)]
+		if not rows:
+			return pd.DataFrame()
+		return pd.concat(rows, ignore_index=True).infer_objects()
\ No newline at end of file